@@ -0,0 +1,126 @@
+'''
+Admission control for requests that need an LLM call.
+
+Cache hits are always served. A miss is admitted only if its client still
+has tokens in its rate-limit bucket and the worker's LLM work queue has
+room; otherwise it is shed, and the caller answers without synonyms right
+away instead of queueing behind everyone else's misses.
+
+Buckets live in Redis (one hash per client, refilled by a Lua script using
+the server's clock), so the limit holds across workers. While Redis is down
+each worker falls back to buckets of its own.
+'''
+import math
+import time
+
+import metrics
+
+# Refills the bucket for the time since the last call, then grants up to
+# ARGV[3] tokens. Returns the tokens granted and, if fewer than asked for,
+# the seconds until the next one.
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+local wait = 0
+if granted < requested then
+    wait = (1 - tokens) / rate
+end
+return {granted, tostring(wait)}
+"""
+
+
+class RateLimiter:
+    '''
+    Token bucket per client: rate tokens per second, up to burst saved up.
+    One token is one title that needs the LLM.
+
+    :param rate: tokens added per second
+    :param burst: bucket size
+    :param prefix: Redis key prefix of the buckets
+    :param max_local_clients: buckets kept per worker while Redis is down
+    '''
+
+    def __init__(self, rate, burst, prefix="ratelimit:", max_local_clients=10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self.max_local_clients = max_local_clients
+        self._clock = clock
+        self._local = {}
+
+    async def acquire(self, client, client_id, requested=1):
+        '''
+        Takes up to requested tokens from client_id's shared bucket
+        :param client: redis.asyncio client
+        :param client_id: API key hash or address of the caller
+        :param requested: tokens wanted
+        :return: (tokens granted, seconds until the next token if fewer
+            were granted, else 0)
+        :raises RedisError: the caller should use acquire_local instead
+        '''
+        granted, wait = await client.eval(
+            _TOKEN_BUCKET_SCRIPT, 1, self.prefix + client_id, self.rate, self.burst, requested
+        )
+        return int(granted), float(wait)
+
+    def acquire_local(self, client_id, requested=1):
+        '''
+        Same as acquire, from a bucket of this worker's own
+        '''
+        now = self._clock()
+        tokens, updated = self._local.pop(client_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        granted = min(requested, math.floor(tokens))
+        tokens -= granted
+        self._local[client_id] = (tokens, now)
+        if len(self._local) > self.max_local_clients:
+            del self._local[next(iter(self._local))]
+        return granted, (1 - tokens) / self.rate if granted < requested else 0.0
+
+
+class WorkQueue:
+    '''
+    Bounds the titles waiting for or in an LLM call on this worker.
+
+    :param limit: most titles at once
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.depth = 0
+
+    def room(self):
+        return max(0, self.limit - self.depth)
+
+    def enter(self, count=1):
+        self.depth += count
+        metrics.set_gauge("llm_queue_depth", self.depth)
+
+    def leave(self, count=1):
+        self.depth -= count
+        metrics.set_gauge("llm_queue_depth", self.depth)
+
+
+class SynonymsPending(Exception):
+    '''
+    Raised instead of calling the LLM for a shed request
+
+    :param reason: "rate_limited" or "queue_full"
+    :param retry_after: seconds after which a retry may be admitted
+    '''
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"synonyms pending: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
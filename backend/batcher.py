@@ -0,0 +1,97 @@
+'''
+Micro-batching for LLM synonym generation.
+
+Misses arriving within a short window are collected and sent to the LLM as
+one multi-title prompt; each waiting caller gets its own title's result back.
+'''
+import asyncio
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    '''
+    Collects submitted items for up to window seconds or max_batch items,
+    whichever comes first, then hands them to dispatch in one call.
+
+    dispatch(items) returns a dict item -> result. Items it leaves out, or all
+    items if it raises, are retried one by one with fallback(item). A batch of
+    a single item goes straight to fallback. If dispatch raises one of the
+    no_retry exception types (e.g. it ran out of time), retrying would only
+    make the callers wait longer, so every item fails with that error instead.
+    '''
+
+    def __init__(self, dispatch, fallback, window, max_batch, name="llm_batch", no_retry=()):
+        self.dispatch = dispatch
+        self.fallback = fallback
+        self.no_retry = no_retry
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name
+        self._queue = []
+        self._timer = None
+
+    async def submit(self, item):
+        '''
+        :param item: item to process
+        :return: result for item
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((item, future, loop.time()))
+        metrics.set_gauge(f"{self.name}_queue_depth", len(self._queue))
+        if len(self._queue) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            asyncio.ensure_future(self._run(batch))
+        metrics.set_gauge(f"{self.name}_queue_depth", 0)
+
+    async def _run(self, batch):
+        now = asyncio.get_running_loop().time()
+        for _, _, enqueued_at in batch:
+            metrics.observe(f"{self.name}_wait_seconds", now - enqueued_at)
+
+        items = list(dict.fromkeys(item for item, _, _ in batch))
+        metrics.observe(f"{self.name}_size", len(items), buckets=metrics.SIZE_BUCKETS)
+        results = {}
+        errors = {}
+        if len(items) > 1:
+            try:
+                results = await self.dispatch(items)
+            except self.no_retry as e:
+                logger.warning("batch of %d failed, not retrying: %r", len(items), e)
+                errors = dict.fromkeys(items, e)
+            except Exception as e:
+                logger.warning("batch of %d failed, falling back to single calls: %s", len(items), e)
+                results = {}
+
+        missing = [item for item in items if item not in results and item not in errors]
+        if len(items) > 1 and missing:
+            metrics.inc(f"{self.name}_fallbacks", len(missing))
+        outcomes = await asyncio.gather(*(self.fallback(item) for item in missing), return_exceptions=True)
+        for item, outcome in zip(missing, outcomes):
+            if isinstance(outcome, Exception):
+                errors[item] = outcome
+            else:
+                results[item] = outcome
+
+        for item, future, _ in batch:
+            if future.done():
+                continue
+            if item in errors:
+                future.set_exception(errors[item])
+            else:
+                future.set_result(results[item])
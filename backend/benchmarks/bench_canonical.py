@@ -0,0 +1,178 @@
+'''
+Cache hit ratio and cost of title canonicalization.
+
+Replays a request stream against an unbounded cache keyed by the old
+strip().lower() key and by canonical_key, and prints both hit ratios and the
+per-call cost as JSON.
+
+With --file, the stream is real titles, one per line (e.g. from a request
+log), in the order they were asked for. Otherwise it is synthetic: base
+roles from the static maps, drawn with a Zipf popularity skew, each typed
+one of two ways:
+
+    table     with the leading seniority words, abbreviations and plurals that
+              canonical.py was written from; these merge by construction
+    held_out  with modifiers and typos the tables know nothing about
+              (Associate, (Senior), ", Remote", swapped letters, ...)
+
+Hit ratios are reported for each kind separately, so the held_out number is
+the one to quote. false_merges counts distinct base roles that end up with
+the same key, i.e. titles that would share synonyms they should not, plus the
+OVER_MERGE_PROBES that lose a word of their role to the seniority rules.
+
+    python -m benchmarks.bench_canonical --requests 100000
+    python -m benchmarks.bench_canonical --file titles.txt
+'''
+import argparse
+import json
+import random
+import timeit
+
+from canonical import canonical_key
+from roles import ROLE_SYNONYMS, SYNONYM_MAP
+
+SENIORITY = ["", "", "", "Senior ", "Sr. ", "Sr ", "Junior ", "Lead ", "Principal "]
+SUFFIXES = ["", "", "", "", " II", " III", "s", " - Remote"]
+ABBREVIATED = {
+    "software engineer": ["SWE", "Software Eng", "SDE"],
+    "machine learning engineer": ["ML Engineer", "ML Eng"],
+    "site reliability engineer": ["SRE"],
+    "product manager": ["PM"],
+    "frontend developer": ["Front-End Developer", "Front End Dev"],
+    "backend developer": ["Back-End Developer", "Backend Dev"],
+    "full stack developer": ["Fullstack Developer", "Full-Stack Dev"],
+    "python developer": ["Python Dev"],
+}
+
+
+# roles containing a seniority word that is part of the role; every word must
+# survive into the key
+OVER_MERGE_PROBES = [
+    "Chief of Staff", "School Principal", "Data Entry Clerk", "Level Designer",
+    "Lead Generation Specialist", "Principal Investigator", "Tech Lead", "Staff",
+]
+
+HELD_OUT_PREFIXES = ["", "", "Associate ", "Experienced ", "Remote ", "Contract "]
+HELD_OUT_SUFFIXES = ["", "", ", Remote", " (Hybrid)", " (Senior)", " (m/f/d)", " - Contract", " @ Acme", " / Remote"]
+
+
+def base_roles():
+    roles = []
+    for table in (ROLE_SYNONYMS, SYNONYM_MAP):
+        for title, synonyms in table.items():
+            roles.append(title)
+            roles.extend(s.lower() for s in synonyms)
+    return list(dict.fromkeys(roles))
+
+
+def typed_variant(role, rng):
+    '''
+    :return: role as a user might type it
+    '''
+    spelling = rng.choice([role] + ABBREVIATED.get(role, []))
+    title = rng.choice(SENIORITY) + spelling
+    suffix = rng.choice(SUFFIXES)
+    if suffix == "s" and title.endswith("s"):
+        suffix = ""
+    title += suffix
+    casing = rng.random()
+    if casing < 0.4:
+        title = title.title()
+    elif casing < 0.5:
+        title = title.upper()
+    if rng.random() < 0.1:
+        title = f"  {title.replace(' ', '  ')} "
+    return title
+
+
+def held_out_variant(role, rng):
+    '''
+    :return: role with modifiers canonical.py has no table entry for, and
+        sometimes a typo
+    '''
+    title = rng.choice(HELD_OUT_PREFIXES) + role + rng.choice(HELD_OUT_SUFFIXES)
+    if rng.random() < 0.1 and len(title) > 3:
+        i = rng.randrange(len(title) - 1)
+        title = title[:i] + title[i + 1] + title[i] + title[i + 2:]
+    if rng.random() < 0.4:
+        title = title.title()
+    return title
+
+
+def request_stream(n, zipf_s, seed, variant):
+    rng = random.Random(seed)
+    roles = base_roles()
+    rng.shuffle(roles)
+    weights = [1 / (rank ** zipf_s) for rank in range(1, len(roles) + 1)]
+    return [variant(role, rng) for role in rng.choices(roles, weights, k=n)]
+
+
+def false_merges():
+    '''
+    :return: number of distinct base roles sharing a key with another one,
+        plus the number of OVER_MERGE_PROBES whose key lost a word
+    '''
+    by_key = {}
+    for role in base_roles():
+        by_key.setdefault(canonical_key(role), set()).add(role.strip().lower())
+    merged = sum(len(roles) for roles in by_key.values() if len(roles) > 1)
+    return merged + sum(len(canonical_key(title).split()) < len(title.split()) for title in OVER_MERGE_PROBES)
+
+
+def file_stream(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def hit_ratio(stream, key_fn):
+    seen = set()
+    hits = 0
+    for title in stream:
+        key = key_fn(title)
+        if key in seen:
+            hits += 1
+        else:
+            seen.add(key)
+    return hits / len(stream), len(seen)
+
+
+def compare(stream):
+    legacy_ratio, legacy_keys = hit_ratio(stream, lambda t: t.strip().lower())
+    canonical_key.cache_clear()
+    canonical_ratio, canonical_keys = hit_ratio(stream, canonical_key)
+    return {
+        "requests": len(stream),
+        "legacy": {"hit_ratio": round(legacy_ratio, 4), "distinct_keys": legacy_keys},
+        "canonical": {"hit_ratio": round(canonical_ratio, 4), "distinct_keys": canonical_keys},
+        "llm_calls_saved": legacy_keys - canonical_keys,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--file", help="replay these titles, one per line, instead of a synthetic stream")
+    args = parser.parse_args(argv)
+
+    if args.file:
+        stream = file_stream(args.file)
+        result = {"file": compare(stream)}
+    else:
+        table = request_stream(args.requests, args.zipf, args.seed, typed_variant)
+        held_out = request_stream(args.requests, args.zipf, args.seed, held_out_variant)
+        stream = table + held_out
+        result = {"table": compare(table), "held_out": compare(held_out), "false_merges": false_merges()}
+
+    sample = stream[:1000]
+    uncached = canonical_key.__wrapped__
+    cold_us = timeit.timeit(lambda: [uncached(t) for t in sample], number=5) / (5 * len(sample)) * 1e6
+    warm_us = timeit.timeit(lambda: [canonical_key(t) for t in sample], number=5) / (5 * len(sample)) * 1e6
+
+    result["canonical_key_us"] = {"uncached": round(cold_us, 2), "memoized": round(warm_us, 2)}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+'''
+Cost of finding the dictionary role in a title: the old linear scan of
+main2.get_synonyms (every key tested with `in`) against RoleMatcher, for
+growing synthetic dictionaries. Prints the per-lookup cost as JSON.
+
+    python -m benchmarks.bench_matcher --sizes 100 1000 10000 50000
+'''
+import argparse
+import json
+import random
+import timeit
+
+from role_matcher import RoleMatcher
+from roles import STATIC_SYNONYMS
+
+SPECIALTIES = ["cloud", "payments", "search", "mobile", "platform", "security", "data", "growth",
+               "embedded", "firmware", "network", "compiler", "graphics", "ios", "android", "web"]
+ROLES = ["engineer", "developer", "analyst", "architect", "manager", "scientist", "designer", "lead"]
+
+
+def dictionary(size, seed):
+    rng = random.Random(seed)
+    table = dict(STATIC_SYNONYMS)
+    while len(table) < size:
+        words = rng.sample(SPECIALTIES, rng.randint(1, 2)) + [f"x{len(table)}", rng.choice(ROLES)]
+        table[" ".join(words)] = ["synonym"]
+    return table
+
+
+def linear_scan(table, job_title):
+    # main2.get_synonyms before RoleMatcher
+    key = job_title.lower().strip()
+    if key in table:
+        return table[key]
+    for map_key, synonyms in table.items():
+        if map_key in key:
+            return synonyms
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark role lookup against dictionary size.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    # a hit late in the dictionary, a partial match and a miss
+    titles = ["Senior Cloud Data Engineer II", "python backend developer", "chief happiness officer"]
+    results = []
+    for size in args.sizes:
+        table = dictionary(size, args.seed)
+        number = max(1, 20000 // size)
+        scan_us = timeit.timeit(lambda: [linear_scan(table, t) for t in titles], number=number)
+        build_s = timeit.timeit(lambda: RoleMatcher(table), number=1)
+        matcher = RoleMatcher(table)
+        match_us = timeit.timeit(lambda: [matcher.lookup(t) for t in titles], number=2000)
+        results.append({
+            "roles": len(table),
+            "linear_scan_us": round(scan_us / (number * len(titles)) * 1e6, 2),
+            "matcher_us": round(match_us / (2000 * len(titles)) * 1e6, 2),
+            "matcher_build_ms": round(build_s * 1000, 1),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
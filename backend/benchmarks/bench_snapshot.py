@@ -0,0 +1,93 @@
+'''
+Per-worker memory and lookup cost of the synonym table held as a dict in
+every worker against the shared memory-mapped snapshot, for growing
+synthetic tables. Prints JSON.
+
+    python -m benchmarks.bench_snapshot --sizes 10000 100000 300000
+'''
+import argparse
+import gc
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from snapshot import SharedSnapshot, write_snapshot
+
+WORDS = ["cloud", "payments", "search", "mobile", "platform", "security", "data", "growth",
+         "embedded", "firmware", "network", "compiler", "graphics", "senior", "staff", "principal"]
+ROLES = ["engineer", "developer", "analyst", "architect", "manager", "scientist", "designer", "lead"]
+
+
+def entries(size, seed):
+    rng = random.Random(seed)
+    for i in range(size):
+        title = f"{' '.join(rng.sample(WORDS, 2))} {rng.choice(ROLES)} {i}"
+        synonyms = [f"{rng.choice(WORDS)} {rng.choice(ROLES)}" for _ in range(5)]
+        yield title, synonyms, math.inf, math.inf
+
+
+def heap_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, after - before
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the shared synonym snapshot.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"synonyms-{size}.snap")
+            table = list(entries(size, args.seed))
+            started = time.perf_counter()
+            write_snapshot(path, table)
+            build_s = time.perf_counter() - started
+
+            rng = random.Random(args.seed)
+            probes = [rng.choice(table)[0] for _ in range(args.lookups // 2)] + \
+                     [f"unknown title {i}" for i in range(args.lookups // 2)]
+            # a fresh copy, as each worker would hold after reading the table
+            as_dict, dict_bytes = heap_bytes(
+                lambda: {title: synonyms for title, synonyms, _, _ in entries(size, args.seed)})
+            shared, snapshot_bytes = heap_bytes(lambda: _mapped(path))
+            del table
+
+            # warm the page cache, as a long-running worker has it
+            [shared.get(p) for p in probes]
+            dict_s = timeit.timeit(lambda: [as_dict.get(p) for p in probes], number=1)
+            snapshot_s = timeit.timeit(lambda: [shared.get(p) for p in probes], number=1)
+            results.append({
+                "titles": size,
+                "file_mb": round(os.path.getsize(path) / 1e6, 2),
+                "build_s": round(build_s, 3),
+                "dict_heap_mb_per_worker": round(dict_bytes / 1e6, 2),
+                "snapshot_heap_mb_per_worker": round(snapshot_bytes / 1e6, 3),
+                "dict_lookup_us": round(dict_s / len(probes) * 1e6, 3),
+                "snapshot_lookup_us": round(snapshot_s / len(probes) * 1e6, 3),
+            })
+            shared.current.close()
+    print(json.dumps(results, indent=2))
+
+
+def _mapped(path):
+    shared = SharedSnapshot(path)
+    shared.reload()
+    return shared
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+'''
+Cold-start cost of the FastAPI backend.
+
+Each run starts a fresh interpreter, so nothing is already imported, and
+measures how long `import server` takes, how long the app takes to start
+(lifespan) and the latency of the first /readyz and the first POST /data
+(a cache miss answered by the stub LLM, see fakes.py). Prints the median
+over --runs as JSON, plus the slowest top-level imports from
+`python -X importtime`.
+
+    python -m benchmarks.bench_startup --runs 5
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# runs in the child interpreter; prints one JSON line of timings in ms
+CHILD = '''
+import asyncio, json, os, time
+os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+os.environ.setdefault("SEMANTIC_INDEX", "memory")
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+
+import httpx
+from benchmarks.fakes import StubLLM, in_memory_redis
+
+async def main():
+    server.use_backends(redis=in_memory_redis(), generate=StubLLM({llm_median_ms}, 0.0, 0.0, seed=7))
+    began = time.perf_counter()
+    async with server.lifespan(server.app):
+        lifespan = time.perf_counter()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            t = time.perf_counter()
+            await client.get("/readyz")
+            readyz = time.perf_counter() - t
+            t = time.perf_counter()
+            response = await client.post("/data", json={{"jobTitle": "Software Engineer"}})
+            first_data = time.perf_counter() - t
+            response.raise_for_status()
+    return lifespan - began, readyz, first_data
+
+lifespan, readyz, first_data = asyncio.run(main())
+print(json.dumps({{
+    "import_server_ms": (imported - started) * 1000,
+    "lifespan_startup_ms": lifespan * 1000,
+    "first_readyz_ms": readyz * 1000,
+    "first_data_ms": first_data * 1000,
+}}))
+'''
+
+
+def backend_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(llm_median_ms):
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD.format(llm_median_ms=llm_median_ms)],
+        cwd=backend_dir(), capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    '''
+    :return: the `top` top-level packages with the largest cumulative import
+        time under `python -X importtime -c "import server"`, in ms
+    '''
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=backend_dir(), capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # nested imports are indented further than the single leading space
+        if not name.startswith("  "):
+            cumulative[name.strip()] = int(cumulative_us) / 1000
+    ordered = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+    return {name: round(ms, 2) for name, ms in ordered[:top]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and first-request latency.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--llm-median-ms", type=float, default=50)
+    parser.add_argument("--top-imports", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    runs = [run_once(args.llm_median_ms) for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "median": {key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]},
+        "slowest_imports_ms": slowest_imports(args.top_imports),
+    }
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+'''
+Stand-ins for Redis and Gemini so the backend can be benchmarked without a
+Redis server or an API key.
+
+The in-memory Redis is fakeredis with Lua support (the lease release uses
+EVAL), a dependency of the benchmarks only:
+
+    pip install -r benchmarks/requirements.txt
+'''
+import asyncio
+import json
+import random
+
+
+def in_memory_redis():
+    '''
+    :return: redis.asyncio-compatible client backed by process memory
+    '''
+    try:
+        from fakeredis import FakeAsyncRedis
+    except ImportError as e:
+        raise SystemExit("the in-memory Redis needs fakeredis: pip install -r benchmarks/requirements.txt") from e
+    return FakeAsyncRedis(decode_responses=True)
+
+
+class StubResponse:
+    def __init__(self, text, prompt_tokens, completion_tokens, finish_reason="STOP"):
+        self.text = text
+        self.usage_metadata = StubUsage(prompt_tokens, completion_tokens)
+        self.candidates = [StubCandidate(finish_reason)]
+
+
+class StubCandidate:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+
+class StubUsage:
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = completion_tokens
+
+
+class StubLLM:
+    '''
+    Answers synonym prompts after a simulated delay.
+
+    Latency is log-normal with the given median and spread (sigma); a share
+    error_rate of calls raise instead. Multi-title prompts get a JSON object
+    back; single-title prompts a JSON list, or a comma-separated one if no
+    JSON was asked for. Output past max_output_tokens (at about 4 characters
+    per token) is cut off, as Gemini would.
+    '''
+
+    def __init__(self, median_ms=800, sigma=0.4, error_rate=0.0, seed=None):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    async def __call__(self, prompt, config=None):
+        self.calls += 1
+        delay = self.median_ms / 1000 * self._rng.lognormvariate(0, self.sigma)
+        await asyncio.sleep(delay)
+        if self._rng.random() < self.error_rate:
+            raise RuntimeError("stub LLM error")
+
+        config = config or {}
+        titles = [line.strip()[2:] for line in prompt.splitlines() if line.strip().startswith("- ")]
+        if titles:
+            text = json.dumps({title: self.synonyms(title) for title in titles})
+        else:
+            title = prompt.split("'")[1] if "'" in prompt else "role"
+            if config.get("response_mime_type") == "application/json":
+                text = json.dumps(self.synonyms(title))
+            else:
+                text = ", ".join(self.synonyms(title))
+        max_chars = config.get("max_output_tokens", len(text)) * 4
+        if len(text) > max_chars:
+            return StubResponse(text[:max_chars], len(prompt) // 4, max_chars // 4, "MAX_TOKENS")
+        return StubResponse(text, len(prompt) // 4, len(text) // 4)
+
+    @staticmethod
+    def synonyms(title):
+        words = title.title()
+        return [f"{words} Specialist", f"{words} Engineer", f"Lead {words}", f"{words} Consultant"]
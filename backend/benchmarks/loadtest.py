@@ -0,0 +1,266 @@
+'''
+Load test and microbenchmarks for the FastAPI backend.
+
+Boots server.app in-process on an in-memory Redis and a stub LLM (see
+fakes.py), drives POST /data with a Zipf-distributed mix of titles at a
+fixed concurrency, and prints latency percentiles, throughput and cache hit
+ratio as JSON, together with microbenchmarks of build_boolean_queries,
+get_synonyms and the /suggest index. Pass --baseline with an earlier run's
+JSON to get the relative change of each number.
+
+    python -m benchmarks.loadtest --requests 5000 --concurrency 64 --out run.json
+    python -m benchmarks.loadtest --baseline run.json
+
+--url points the load test at a running server instead (its own Redis and
+LLM are used, microbenchmarks are skipped).
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import timeit
+
+# must be set before server is imported: it reads its config at import time
+os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+os.environ.setdefault("SEMANTIC_INDEX", "memory")
+# every request comes from one address; set these to load test admission control
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+os.environ.setdefault("LLM_QUEUE_SIZE", "100000")
+os.environ.setdefault("NEGATIVE_BLOOM_VERIFY_RATE", "0")
+
+import httpx
+
+from benchmarks.fakes import StubLLM, in_memory_redis
+from roles import ROLE_SYNONYMS, SYNONYM_MAP
+
+
+def title_mix(unique_titles, seed):
+    '''
+    :return: list of distinct titles, most popular first
+    '''
+    rng = random.Random(seed)
+    titles = list(dict.fromkeys(
+        t.lower() for table in (ROLE_SYNONYMS, SYNONYM_MAP)
+        for title, synonyms in table.items() for t in [title, *synonyms]
+    ))
+    specialties = ["cloud", "payments", "search", "mobile", "platform", "security", "data", "growth"]
+    roles = ["engineer", "developer", "analyst", "architect", "manager", "scientist"]
+    while len(titles) < unique_titles:
+        titles.append(f"{rng.choice(specialties)} {rng.choice(roles)} {len(titles)}")
+    titles = titles[:unique_titles]
+    rng.shuffle(titles)
+    return titles
+
+
+def zipf_requests(titles, n, s, seed):
+    rng = random.Random(seed)
+    weights = [1 / rank ** s for rank in range(1, len(titles) + 1)]
+    return rng.choices(titles, weights, k=n)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def drive(client, requests, concurrency):
+    '''
+    sends the requests with `concurrency` workers
+    :return: (latencies in ms, error count, wall time in s)
+    '''
+    queue = iter(requests)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for title in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/data", json={"jobTitle": title})
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def latency_summary(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+async def microbenchmarks(server, titles):
+    '''
+    :return: per-call cost of build_boolean_queries, of title validation, of
+        get_synonyms on an L1 hit, an L2 (Redis) hit and a negative cache hit,
+        and of a /suggest prefix and typo lookup
+    '''
+    number = 2000
+    build_us = timeit.timeit(lambda: server.build_boolean_queries(titles[0]), number=number) / number * 1e6
+
+    title = titles[0]
+    await server.get_synonyms(title)
+
+    started = time.perf_counter()
+    for _ in range(number):
+        await server.get_synonyms(title)
+    l1_us = (time.perf_counter() - started) / number * 1e6
+
+    started = time.perf_counter()
+    for _ in range(number):
+        server.l1_cache.clear()
+        await server.get_synonyms(title)
+    l2_us = (time.perf_counter() - started) / number * 1e6
+
+    validate_us = timeit.timeit(lambda: server.check_title(title), number=number) / number * 1e6
+    junk = "chief vibes officer"
+    server.negative_cache.add(server.canonical_key(junk))
+    started = time.perf_counter()
+    for _ in range(number):
+        server.l1_cache.clear()
+        await server.get_synonyms(junk)
+    negative_us = (time.perf_counter() - started) / number * 1e6
+
+    # every keystroke of a title, and the title with its first letters swapped
+    prefixes = [title[:n] for title in titles[:50] for n in range(1, len(title) + 1)]
+    suggest_us = timeit.timeit(
+        lambda: [server.title_index.suggest(p) for p in prefixes], number=10
+    ) / (10 * len(prefixes)) * 1e6
+    typos = [title[1] + title[0] + title[2:] for title in titles[:50]]
+    started = time.perf_counter()
+    for typo in typos:
+        server.title_index._fuzzy_cache.clear()
+        server.title_index.suggest(typo)
+    typo_us = (time.perf_counter() - started) / len(typos) * 1e6
+
+    return {
+        "build_boolean_queries_us": round(build_us, 2),
+        "suggest_prefix_us": round(suggest_us, 2),
+        "suggest_typo_uncached_us": round(typo_us, 2),
+        "get_synonyms_l1_hit_us": round(l1_us, 2),
+        "get_synonyms_l2_hit_us": round(l2_us, 2),
+        "get_synonyms_negative_hit_us": round(negative_us, 2),
+        "validate_title_us": round(validate_us, 2),
+    }
+
+
+def hit_ratio(stats, requests):
+    # every request is an L1 hit (response-cache hits included), an L2 hit or a miss
+    hits = stats.get("cache_l1_hits", 0) + stats.get("cache_l2_hits", 0)
+    return round(hits / requests, 4) if requests else 0.0
+
+
+async def run_in_process(args, requests, titles):
+    import metrics
+    import server
+
+    llm = StubLLM(args.llm_median_ms, args.llm_sigma, args.llm_error_rate, seed=args.seed)
+    server.use_backends(redis=in_memory_redis(), generate=llm)
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            latencies, errors, wall = await drive(client, requests, args.concurrency)
+            stats = metrics.snapshot()
+            micro = await microbenchmarks(server, titles)
+    return latencies, errors, wall, {
+        "hit_ratio": hit_ratio(stats, len(requests)),
+        "llm_calls": llm.calls,
+        "coalesced": stats.get("llm_calls_coalesced", 0),
+        "semantic_hits": stats.get("semantic_hits", 0),
+        "shed": sum(value for name, value in stats.items() if name.startswith("requests_shed{")),
+        "completion_tokens": sum(value for name, value in stats.items()
+                                 if name.startswith("llm_completion_tokens{")),
+    }, micro
+
+
+async def run_against_url(args, requests):
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        latencies, errors, wall = await drive(client, requests, args.concurrency)
+    return latencies, errors, wall, {}, {}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline):
+    '''
+    :return: relative change of every number present in both runs
+    '''
+    delta = {}
+    for section in ("latency", "microbenchmarks"):
+        for key, value in result.get(section, {}).items():
+            old = baseline.get(section, {}).get(key)
+            if old:
+                delta[f"{section}.{key}"] = round((value - old) / old, 4)
+    if baseline.get("requests_per_second"):
+        old = baseline["requests_per_second"]
+        delta["requests_per_second"] = round((result["requests_per_second"] - old) / old, 4)
+    return delta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the /data endpoint.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--titles", type=int, default=500, help="distinct titles in the mix")
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew of the title mix")
+    parser.add_argument("--llm-median-ms", type=float, default=800)
+    parser.add_argument("--llm-sigma", type=float, default=0.4, help="log-normal spread of LLM latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="benchmark a running server instead of an in-process one")
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    titles = title_mix(args.titles, args.seed)
+    requests = zipf_requests(titles, args.requests, args.zipf, args.seed)
+    if args.url:
+        latencies, errors, wall, cache, micro = asyncio.run(run_against_url(args, requests))
+    else:
+        latencies, errors, wall, cache, micro = asyncio.run(run_in_process(args, requests, titles))
+
+    result = {
+        "commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "requests_per_second": round(len(requests) / wall, 2),
+        "errors": errors,
+        "latency": latency_summary(latencies),
+        "cache": cache,
+        "microbenchmarks": micro,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["change_vs_baseline"] = compare(result, json.load(f))
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
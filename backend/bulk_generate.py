@@ -0,0 +1,249 @@
+'''
+Offline bulk generation: synonyms and boolean queries for a whole catalog of
+job titles, written to JSONL. Meant for a nightly job.
+
+Titles are streamed from title files (.txt one per line, .csv, .jsonl) in
+chunks, canonicalized and deduplicated the way the server does it. For each
+chunk, cached synonyms are read with one MGET; the misses are generated with
+multi-title prompts: a bounded number in flight for Gemini, or a pool of
+worker processes each running the local model (LLM_PROVIDER=local). One JSON line per title is
+appended to the output as each chunk completes, so memory stays bounded by
+the chunk size (plus the set of titles already seen).
+
+    {"jobTitle": "data engineer", "additional_job_titles": [...], "data": [...], "source": "cache"}
+    {"jobTitle": "chief vibes officer", "error": "no synonyms generated"}
+
+"source" is cache, static or llm. Progress (titles/s) goes to stderr, and a
+checkpoint after every chunk lets --resume continue an interrupted run
+without duplicating output.
+
+    python bulk_generate.py --file catalog.csv --out catalog.jsonl
+    LLM_PROVIDER=local python bulk_generate.py --file catalog.csv --out catalog.jsonl --processes 4 --resume
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+from redis.exceptions import RedisError
+
+import server
+from freshness import decode_entry, encode_entry
+from providers import LocalModelProcessPool
+from roles import STATIC_SYNONYMS
+from warm_cache import chunked, file_titles, unique_titles
+
+
+# -----checkpoints------
+def load_checkpoint(path):
+    '''
+    :param path: checkpoint file
+    :return: (titles handled, output file size after them) of the last run
+    '''
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return 0, 0
+    return state["done"], state["output_offset"]
+
+
+def save_checkpoint(path, done, output_offset):
+    # write-then-rename so a crash never leaves a half-written checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"done": done, "output_offset": output_offset, "updated_at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+# -----generation------
+async def cached_synonyms(client, titles):
+    '''
+    :param client: redis.asyncio client
+    :param titles: canonical titles
+    :return: dict title -> synonyms for the titles that are cached with some
+    '''
+    found = {}
+    for title, raw in zip(titles, await client.mget(titles)):
+        if raw:
+            synonyms = decode_entry(raw)[0]
+            if synonyms:
+                found[title] = synonyms
+    return found
+
+
+async def generate(titles, call_batch, semaphore, batch_size):
+    '''
+    :param titles: titles to generate synonyms for
+    :param call_batch: coroutine function titles -> dict title -> synonyms
+    :param semaphore: bounds the number of batches in flight
+    :param batch_size: titles per batch
+    :return: dict title -> synonyms; failed titles are missing
+    '''
+    async def one_batch(batch):
+        async with semaphore:
+            try:
+                return await call_batch(batch)
+            except Exception as e:
+                print(f"batch of {len(batch)} failed: {e}", file=sys.stderr)
+                return {}
+
+    results = {}
+    batches = [titles[i:i + batch_size] for i in range(0, len(titles), batch_size)]
+    for found in await asyncio.gather(*(one_batch(batch) for batch in batches)):
+        results.update(found)
+    return results
+
+
+def output_rows(chunk, synonyms, sources, platform):
+    for title in chunk:
+        if title not in synonyms:
+            yield {"jobTitle": title, "error": "no synonyms generated"}
+            continue
+        yield {
+            "jobTitle": title,
+            "additional_job_titles": synonyms[title],
+            "data": server.build_boolean_queries(title, synonyms[title], platform),
+            "source": sources[title],
+        }
+
+
+async def run_pipeline(titles, out_path, call_batch, client, args):
+    '''
+    generates and writes one chunk at a time, printing progress
+    :param titles: stream of canonical titles
+    :param out_path: JSONL output file
+    :param call_batch: coroutine function titles -> dict title -> synonyms
+    :param client: redis.asyncio client, or None to skip the cache
+    :param args: parsed command line
+    :return: dict of totals
+    '''
+    done, offset = load_checkpoint(args.checkpoint) if args.resume else (0, 0)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    totals = {"titles": 0, "cache": 0, "static": 0, "llm": 0, "no_synonyms": 0, "failed": 0}
+    started = time.perf_counter()
+
+    with open(out_path, "a+b" if args.resume else "wb") as out:
+        # drop lines written after the last checkpoint; they are regenerated
+        out.truncate(offset)
+        out.seek(offset)
+        # the title stream is deterministic for the same inputs, so resuming
+        # is just skipping what the last run got through
+        for chunk in chunked(itertools.islice(titles, done, None), args.chunk_size):
+            synonyms, sources = {}, {}
+            if client is not None:
+                for title, found in (await cached_synonyms(client, chunk)).items():
+                    synonyms[title], sources[title] = found, "cache"
+            if args.static_synonyms:
+                for title in chunk:
+                    if title not in synonyms and title in STATIC_SYNONYMS:
+                        synonyms[title], sources[title] = list(STATIC_SYNONYMS[title]), "static"
+            missing = [title for title in chunk if title not in synonyms]
+            generated = await generate(missing, call_batch, semaphore, args.batch_size)
+            # titles the LLM had no usable synonyms for are reported as failed
+            # and, like on the server, only remembered in the negative cache
+            no_synonyms = [title for title, found in generated.items() if not found]
+            for title, found in generated.items():
+                if found:
+                    synonyms[title], sources[title] = found, "llm"
+            if client is not None and args.write_cache and generated:
+                async with client.pipeline(transaction=False) as pipe:
+                    for title, found in generated.items():
+                        if found:
+                            pipe.setex(title, server.CACHE_HARD_TTL,
+                                       encode_entry(found, server.CACHE_TTL, server.CACHE_HARD_TTL))
+                        else:
+                            server.negative_cache.store(pipe, title)
+                    await pipe.execute()
+
+            out.write(b"".join(
+                json.dumps(row).encode() + b"\n"
+                for row in output_rows(chunk, synonyms, sources, args.platform)
+            ))
+            out.flush()
+            os.fsync(out.fileno())
+            done += len(chunk)
+            save_checkpoint(args.checkpoint, done, out.tell())
+
+            totals["titles"] += len(chunk)
+            for source in sources.values():
+                totals[source] += 1
+            totals["no_synonyms"] += len(no_synonyms)
+            totals["failed"] += len(chunk) - len(synonyms)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{done} titles | {totals['cache']} cached, {totals['llm']} generated, "
+                f"{totals['failed']} failed | {totals['titles'] / elapsed:.1f} titles/s",
+                file=sys.stderr,
+            )
+    totals["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    totals["titles_per_second"] = round(totals["titles"] / totals["elapsed_seconds"], 2) \
+        if totals["elapsed_seconds"] else 0.0
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synonyms and queries for a catalog of titles.")
+    parser.add_argument("--file", action="append", required=True,
+                        help="title list (.txt, .csv or .jsonl); may be repeated")
+    parser.add_argument("--column", default="title", help="CSV column / JSONL field with the title")
+    parser.add_argument("--out", required=True, help="JSONL output file")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for the local model")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="batches in flight (default: LLM_MAX_CONCURRENCY for gemini, --processes for local)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="titles per prompt (default: LLM_BATCH_SIZE for gemini, LOCAL_MODEL_BATCH_SIZE for local)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="titles read, looked up and written at once")
+    parser.add_argument("--platform", choices=sorted(server.PLATFORM_BUDGETS), default="linkedin")
+    parser.add_argument("--no-cache", action="store_true", help="don't read cached synonyms from Redis")
+    parser.add_argument("--write-cache", action="store_true", help="also cache the generated synonyms in Redis")
+    parser.add_argument("--static-synonyms", action="store_true",
+                        help="use the static maps' synonyms for their titles instead of generating them")
+    parser.add_argument("--checkpoint", default=".bulk_generate.checkpoint")
+    parser.add_argument("--resume", action="store_true", help="continue the last run")
+    args = parser.parse_args(argv)
+
+    local = server.LLM_PROVIDER == "local"
+    if args.concurrency is None:
+        args.concurrency = args.processes if local else server.LLM_MAX_CONCURRENCY
+    if args.batch_size is None:
+        args.batch_size = server.LOCAL_MODEL_BATCH_SIZE if local else server.LLM_BATCH_SIZE
+
+    titles = unique_titles(file_titles(path, args.column) for path in args.file)
+    client = None if args.no_cache else server.redis_client
+
+    async def run():
+        if local:
+            # processes * threads should not oversubscribe the cores
+            threads = server.LOCAL_MODEL_THREADS or max(1, (os.cpu_count() or 1) // args.processes)
+            provider = LocalModelProcessPool(
+                args.processes, model=server.LOCAL_MODEL, runtime=server.LOCAL_MODEL_RUNTIME,
+                batch_size=args.batch_size, threads=threads,
+            )
+            call_batch = provider.synonyms_batch
+        else:
+            provider = server.synonym_provider
+            # through the server's deadlines, circuit breaker and concurrency bound
+            call_batch = server.llm_call_batch
+        try:
+            await provider.start()
+            return await run_pipeline(titles, args.out, call_batch, client, args)
+        finally:
+            await provider.close()
+            await server.redis_client.aclose()
+
+    try:
+        totals = asyncio.run(run())
+    except RedisError as e:
+        print(f"Redis error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(totals))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+'''
+Job title canonicalization.
+
+Every cache key is built with canonical_key, so spelling variants of the same
+role share one Redis entry and one LLM call:
+
+    "Sr. Software Engineers", "senior  SWE", "Software Engineer II"
+        -> "software engineer"
+
+The tables below are compiled into regular expressions once at import; a
+call costs a few microseconds (and is memoized for repeated titles).
+'''
+import re
+from functools import lru_cache
+
+# Abbreviations and spelling variants -> canonical wording. Keys are matched
+# as whole words on the punctuation-free, casefolded title.
+ABBREVIATIONS = {
+    "sr": "senior",
+    "snr": "senior",
+    "jr": "junior",
+    "jnr": "junior",
+    "swe": "software engineer",
+    "sde": "software engineer",
+    "sw": "software",
+    "ml": "machine learning",
+    "sre": "site reliability engineer",
+    "pm": "product manager",
+    "tpm": "technical program manager",
+    "dev": "developer",
+    "devs": "developers",
+    "eng": "engineer",
+    "engr": "engineer",
+    "mgr": "manager",
+    "mngr": "manager",
+    "sysadmin": "system administrator",
+    "js": "javascript",
+    "k8s": "kubernetes",
+    "front end": "frontend",
+    "back end": "backend",
+    "fullstack": "full stack",
+}
+
+# Seniority modifiers, dropped only from the front of a title and only while a
+# role noun follows: the synonyms of a role don't depend on its level, but
+# "chief of staff", "school principal" and "tech lead" are roles of their own.
+# "chief" is not one: a chief executive officer is not an executive officer.
+SENIORITY_PREFIXES = {"senior", "junior", "principal", "staff", "lead"}
+# Dropped only together with a following "level", also from the front ("entry
+# level analyst", but not "data entry clerk"). "senior level designer" keeps
+# "level designer".
+LEVEL_PREFIXES = {"mid", "entry"}
+# Leading phrases that start with a seniority word but are part of the role.
+NOT_SENIORITY = {("lead", "generation"), ("principal", "investigator"), ("staff", "sergeant")}
+# Dropped only as the last word ("engineer ii").
+LEVEL_SUFFIXES = {"i", "ii", "iii", "iv", "1", "2", "3", "4"}
+# Last words that end in "s" but are not plurals.
+NOT_PLURAL = {
+    "devops", "mlops", "dataops", "ops", "analytics", "sales", "operations",
+    "logistics", "systems", "ios", "aws", "kubernetes", "services", "robotics",
+    "economics", "statistics", "graphics", "news", "payments", "relations",
+}
+
+_DOTNET_RE = re.compile(r"\.net\b")
+# punctuation only; letters and digits of any script are kept
+_PUNCT_RE = re.compile(r"[^\w+#\s]+|_")
+_ABBREVIATION_RE = re.compile(
+    r"\b(?:" + "|".join(sorted(map(re.escape, ABBREVIATIONS), key=len, reverse=True)) + r")\b"
+)
+
+
+def normalize_title(title):
+    '''
+    Light cleanup for display: lowercase and collapse whitespace
+    :param title: raw job title
+    :return: normalized title
+    '''
+    return " ".join(title.split()).lower()
+
+
+def _singular(word):
+    if len(word) <= 3 or word in NOT_PLURAL or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=8192)
+def canonical_key(title):
+    '''
+    Builds the cache key for a job title
+    :param title: raw job title
+    :return: canonical title; empty if the title has no words
+    '''
+    text = _DOTNET_RE.sub(" dotnet", title.casefold())
+    text = " ".join(_PUNCT_RE.sub(" ", text).split())
+    text = _ABBREVIATION_RE.sub(lambda m: ABBREVIATIONS[m.group(0)], text)
+
+    words = text.split()
+    while True:
+        if len(words) > 2 and words[0] in LEVEL_PREFIXES and words[1] == "level":
+            del words[:2]
+        elif len(words) > 1 and words[0] in SENIORITY_PREFIXES and tuple(words[:2]) not in NOT_SENIORITY:
+            del words[0]
+        else:
+            break
+    while words and words[-1] in LEVEL_SUFFIXES:
+        words.pop()
+    if not words:
+        # the title was nothing but a level ("II"); keep it
+        return text
+    words[-1] = _singular(words[-1])
+    return " ".join(words)
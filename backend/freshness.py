@@ -0,0 +1,64 @@
+'''
+Soft/hard expiry for synonym cache entries.
+
+Redis expires a key at its hard TTL. Each value also records a soft expiry:
+past it, the entry is stale and is still served while a background refresh
+replaces it.
+'''
+import json
+import time
+
+
+def encode_entry(synonyms, soft_ttl, hard_ttl, now=None):
+    '''
+    :param synonyms: list of synonyms
+    :param soft_ttl: timedelta after which the entry should be refreshed
+    :param hard_ttl: timedelta after which Redis drops the entry
+    :param now: current unix time, defaults to time.time()
+    :return: JSON string to store in Redis
+    '''
+    now = time.time() if now is None else now
+    return json.dumps({
+        "synonyms": synonyms,
+        "soft_expiry": now + soft_ttl.total_seconds(),
+        "hard_expiry": now + hard_ttl.total_seconds(),
+    })
+
+
+def decode_entry(raw):
+    '''
+    :param raw: value read from Redis
+    :return: (synonyms, soft_expiry). Plain lists written before entries had
+        an envelope are returned as already stale.
+    '''
+    value = json.loads(raw)
+    if isinstance(value, list):
+        return value, 0.0
+    return value["synonyms"], value["soft_expiry"]
+
+
+class HitCounter:
+    '''
+    Counts hits per key over a fixed window, to tell hot keys from cold ones.
+    Tracks at most maxsize keys; the oldest windows are dropped first.
+    '''
+
+    def __init__(self, window, maxsize=10000, clock=time.monotonic):
+        self.window = window
+        self.maxsize = maxsize
+        self._clock = clock
+        self._counts = {}
+
+    def hit(self, key):
+        '''
+        :param key: key that was just read
+        :return: number of hits for key in the current window, this one included
+        '''
+        now = self._clock()
+        count, started = self._counts.pop(key, (0, now))
+        if now - started > self.window:
+            count, started = 0, now
+        self._counts[key] = (count + 1, started)
+        if len(self._counts) > self.maxsize:
+            del self._counts[next(iter(self._counts))]
+        return count + 1
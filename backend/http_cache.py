@@ -0,0 +1,54 @@
+'''
+Whole-response caching and HTTP validators for /data.
+
+A CachedResponse holds a serialized response body with a strong ETag (a
+hash of the body) and its Cache-Control header, so a repeat request is
+answered without rebuilding the queries or re-serializing JSON, and a
+conditional one (If-None-Match) gets a 304 without a body.
+'''
+import hashlib
+import json
+
+
+class CachedResponse:
+    '''
+    :param body: serialized JSON body
+    :param synonyms: the synonyms list the body was built from; the entry is
+        valid only while the synonym cache still holds this very list
+    :param max_age: seconds browsers and proxies may reuse the response;
+        0 makes it "no-cache"
+    :param stale_seconds: seconds past max_age it may be served while being
+        revalidated
+    '''
+    __slots__ = ("body", "etag", "synonyms", "headers")
+
+    def __init__(self, body, synonyms, max_age, stale_seconds=0):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.synonyms = synonyms
+        if max_age > 0:
+            cache_control = f"public, max-age={int(max_age)}"
+            if stale_seconds > 0:
+                cache_control += f", stale-while-revalidate={int(stale_seconds)}"
+        else:
+            cache_control = "no-cache"
+        self.headers = {"ETag": self.etag, "Cache-Control": cache_control}
+
+
+def dump_json(payload):
+    # the same compact encoding as FastAPI's JSONResponse
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def etag_matches(if_none_match, etag):
+    '''
+    :param if_none_match: If-None-Match request header, or None
+    :param etag: current ETag of the resource
+    :return: True if the client's copy is current (weak comparison, as
+        RFC 9110 prescribes for If-None-Match)
+    '''
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
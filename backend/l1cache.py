@@ -0,0 +1,106 @@
+'''
+Bounded in-process LRU cache with per-entry TTL, used as the first tier in
+front of Redis.
+'''
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+
+class LRUTTLCache:
+    '''
+    Least-recently-used cache whose entries expire after ttl seconds.
+
+    Expired entries are kept for another stale_seconds so they can still be
+    served (via get_stale) while Redis is unreachable.
+    '''
+
+    def __init__(self, maxsize, ttl, stale_seconds=0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        self._clock = clock
+        self._data = OrderedDict()
+
+    def get(self, key):
+        '''
+        :param key: cache key
+        :return: fresh value, or None if missing or expired
+        '''
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        now = self._clock()
+        if now >= expires_at:
+            if now >= expires_at + self.stale_seconds:
+                del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def get_stale(self, key):
+        '''
+        :param key: cache key
+        :return: value even if expired, as long as it is within the stale window
+        '''
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if self._clock() >= expires_at + self.stale_seconds:
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (value, self._clock() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+async def listen_for_invalidations(client, cache, channel, origin, retry_seconds=1.0, on_key=None):
+    '''
+    Evicts keys from cache as other workers announce rewrites on a Redis
+    pub/sub channel. Runs until cancelled and resubscribes after errors.
+    :param client: redis.asyncio client
+    :param cache: LRUTTLCache to evict from
+    :param channel: pub/sub channel name
+    :param origin: id of this worker; its own announcements are ignored
+    :param retry_seconds: pause before resubscribing after a failure
+    :param on_key: optional callback, called with every key another worker
+        rewrote
+    '''
+    while True:
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                payload = json.loads(message["data"])
+                if payload.get("origin") != origin:
+                    cache.delete(payload["key"])
+                    if on_key is not None:
+                        on_key(payload["key"])
+        except (RedisError, OSError):
+            # we may have missed invalidations while disconnected
+            cache.clear()
+            await asyncio.sleep(retry_seconds)
+        finally:
+            await pubsub.aclose()
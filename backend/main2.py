@@ -2,19 +2,13 @@ import streamlit as st
 import re
 
 # --- 1. The "Brain": A Synonym Dictionary ---
-SYNONYM_MAP = {
-    "software engineer": ["Software Developer", "Backend Engineer", "Full Stack Developer", "Developer", "Programmer"],
-    "python developer": ["Python Engineer", "Backend Engineer", "Software Engineer (Python)", "Data Engineer"],
-    "python engineer": ["Python Developer", "Backend Engineer", "Software Engineer (Python)", "Data Engineer"],
-    "data scientist": ["Data Analyst", "Machine Learning Engineer", "ML Engineer", "Business Intelligence Analyst"],
-    "data engineer": ["Data Architect", "Pipeline Developer", "ETL Developer", "Big Data Engineer"],
-    "frontend developer": ["Frontend Engineer", "UI Developer", "React Developer", "Web Developer"],
-    "backend developer": ["Backend Engineer", "Software Engineer", "Python Developer", "Java Developer"],
-    "full stack developer": ["Full Stack Engineer", "Software Engineer", "Web Developer"],
-    "machine learning engineer": ["ML Engineer", "Data Scientist", "AI Engineer", "Computer Vision Engineer"],
-    "devops engineer": ["SRE", "Site Reliability Engineer", "Platform Engineer", "Cloud Engineer"],
-    "product manager": ["PM", "Technical Product Manager", "Product Owner"]
-}
+# Shared with server.py and the cache warmer, see roles.py. This app has
+# always answered from SYNONYM_MAP alone, so it gets its own matcher rather
+# than ROLE_MATCHER, where ROLE_SYNONYMS wins on overlapping titles.
+from role_matcher import RoleMatcher
+from roles import SYNONYM_MAP
+
+SYNONYM_MATCHER = RoleMatcher(SYNONYM_MAP)
 
 # --- 2. The Query "Ingredients" ---
 ACTION_PHRASES = [
@@ -40,20 +34,11 @@ EXCLUSION_PHRASES = [
 # --- 3. The Function to Get Synonyms ---
 def get_synonyms(job_title):
     """
-    Finds synonyms from the pre-defined map.
+    Finds synonyms from the pre-defined map: those of the most specific
+    role mentioned in the title, in one pass over the title.
     """
-    key = job_title.lower().strip()  # Clean the input
-
-    # Check for a direct match
-    if key in SYNONYM_MAP:
-        return SYNONYM_MAP[key]
-
-    # Check for partial matches
-    for map_key, synonyms in SYNONYM_MAP.items():
-        if map_key in key:
-            return synonyms
-
-    return []  # Return empty list if no match
+    synonyms = SYNONYM_MATCHER.lookup(job_title)
+    return list(synonyms) if synonyms is not None else []  # Return empty list if no match
 
 
 # --- 4. NEW: The Multi-Query Builder ---
@@ -1,16 +1,28 @@
 import streamlit as st
-import re
-from transformers import pipeline
+from concurrent.futures import ThreadPoolExecutor
 
+from providers import generate_local
+from roles import ROLE_MATCHER
 
-# --- 1. Load the LLM (This will be cached) ---
-@st.cache_resource
+
+# --- 1. Load the LLM (in the background, cached) ---
 def load_model():
-    """Loads the T5 model one time and caches it."""
-    # st.toast("Loading AI model... (this may take a moment on first run)")
+    """Loads the T5 model. transformers is imported here so the page can render without waiting for it."""
+    from transformers import pipeline
     return pipeline("text2text-generation", model="google/flan-t5-base")
 
 
+@st.cache_resource
+def start_model_loading():
+    """Starts loading the model on a background thread, one time per process, and returns its future."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader").submit(load_model)
+
+
+def static_synonyms(job_title):
+    """Synonyms from the built-in role maps, used until the model is ready."""
+    return list(ROLE_MATCHER.lookup(job_title) or [])
+
+
 # --- 2. The Query "Ingredients" (from v4) ---
 ACTION_PHRASES = [
     "hiring",
@@ -37,39 +49,11 @@ def get_synonyms_from_llm(job_title, generator):
     Uses the LLM to generate synonyms and aggressively cleans the output.
     """
 
-    # This prompt is a direct command, which works better.
-    # We ask for "comma-separated" to guide the format.
-    prompt = f"""
-    Task: Generate a list of 4 common synonyms or related job titles for "{job_title}".
-    Format: A single line, comma-separated.
-    Titles:
-    """
-
+    # The same prompt, output cap and cleaning as the API's local provider:
+    # split by comma or newline, drop empty strings, random sentences and
+    # repeats of the input, keep at most 4.
     try:
-        outputs = generator(prompt, max_length=128, num_return_sequences=1)
-        raw_text = outputs[0]['generated_text']
-
-        # --- Robust Parsing Logic ---
-        # The LLM output is messy. We clean it.
-        synonyms = []
-
-        # Split by comma OR a newline
-        candidates = re.split(r'[,\n]', raw_text)
-
-        for s in candidates:
-            synonym = s.strip().title()  # Clean, strip whitespace, capitalize
-
-            # Filter out junk:
-            if not synonym:
-                continue  # Skip empty strings
-            if len(synonym) > 35:
-                continue  # Skip any random sentences it generated
-            if synonym.lower() == job_title.lower():
-                continue  # Skip if it just repeats the input
-
-            synonyms.append(synonym)
-
-        return list(set(synonyms))  # Return unique, clean synonyms
+        return generate_local(generator, [job_title]).get(job_title, [])
 
     except Exception as e:
         st.error(f"Error calling LLM: {e}")
@@ -114,10 +98,12 @@ st.title("🧠 Smart Job Query Generator (v5 - AI Hybrid)")
 st.markdown("Enter a job title. I'll use an **LLM** to brainstorm synonyms and generate 6 query variations.")
 st.info("ℹ️ **Tip:** Try these queries one by one in the LinkedIn **Posts** filter, starting with #1.")
 
-# Load the model at the start
+# Start loading the model; the page renders while it loads
 try:
-    st.toast("Loading AI model... (this may take a moment on first run)")
-    generator = load_model()
+    model_loading = start_model_loading()
+    generator = model_loading.result() if model_loading.done() else None
+    if generator is None:
+        st.toast("Loading AI model in the background... built-in related roles are used until it is ready")
 
     job_title = st.text_input("Enter your desired job title:", "Software Engineer")
 
@@ -127,14 +113,19 @@ try:
         else:
             with st.spinner("🧠 Asking AI for related roles..."):
 
-                # 1. Get synonyms from the LLM
-                synonyms = get_synonyms_from_llm(job_title, generator)
+                # 1. Get synonyms from the LLM, or the built-in maps while it loads
+                if generator is not None:
+                    synonyms = get_synonyms_from_llm(job_title, generator)
+                    found_label = "AI found these related roles:"
+                else:
+                    synonyms = static_synonyms(job_title)
+                    found_label = "Built-in related roles (the AI model is still loading):"
 
                 if synonyms:
-                    st.subheader("AI found these related roles:")
+                    st.subheader(found_label)
                     st.write(", ".join(synonyms))
                 else:
-                    st.warning(f"The AI didn't return usable synonyms. Building queries with the main title only.")
+                    st.warning(f"No usable synonyms were found. Building queries with the main title only.")
 
                 # 2. Build the *list* of queries
                 st.subheader("Here is your query list:")
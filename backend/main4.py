@@ -1,15 +1,28 @@
 import streamlit as st
-import re
-from transformers import pipeline
+from concurrent.futures import ThreadPoolExecutor
 
+from providers import generate_local
+from roles import ROLE_MATCHER
 
-# --- 1. Load the LLM (Cached) ---
-@st.cache_resource
+
+# --- 1. Load the LLM (in the background, cached) ---
 def load_model():
-    """Loads the T5 model one time and caches it."""
+    """Loads the T5 model. transformers is imported here so the page can render without waiting for it."""
+    from transformers import pipeline
     return pipeline("text2text-generation", model="google/flan-t5-large")
 
 
+@st.cache_resource
+def start_model_loading():
+    """Starts loading the model on a background thread, one time per process, and returns its future."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader").submit(load_model)
+
+
+def static_synonyms(job_title):
+    """Synonyms from the built-in role maps, used until the model is ready."""
+    return list(ROLE_MATCHER.lookup(job_title) or [])[:3]
+
+
 # --- 2. Query "Ingredients" (NOW RESPECTING LIMITS) ---
 # We keep these lists short (<= 4 items) to obey the <= 5 OR clause limit.
 ACTION_PHRASES = [
@@ -31,33 +44,10 @@ def get_synonyms_from_llm(job_title, generator):
     Uses the LLM to generate synonyms and aggressively cleans the output.
     """
 
-    # We ask for 3-4 synonyms to stay within the 5-term OR limit.
-    prompt = f"""
-    Task: Generate a list of 3 common synonyms or related job titles for "{job_title}".
-    Format: A single line, comma-separated.
-    Titles:
-    """
-
+    # We ask for 3 synonyms to stay within the 5-term OR limit; the shared
+    # generator caps the output length and keeps at most that many.
     try:
-        outputs = generator(prompt, max_length=128, num_return_sequences=1)
-        raw_text = outputs[0]['generated_text']
-
-        synonyms = []
-        candidates = re.split(r'[,\n]', raw_text)
-
-        for s in candidates:
-            synonym = s.strip().title()
-
-            if not synonym: continue
-            if len(synonym) > 35: continue
-            if synonym.lower() == job_title.lower(): continue
-
-            synonyms.append(synonym)
-
-        # --- LIMITER ---
-        # We only take the first 3 synonyms to keep our queries short.
-        print(synonyms)
-        return list(set(synonyms))[:3]
+        return generate_local(generator, [job_title], max_new_tokens=48, count=3).get(job_title, [])
 
     except Exception as e:
         st.error(f"Error calling LLM: {e}")
@@ -125,8 +115,11 @@ st.markdown(
 st.info("ℹ️ **Tip:** These queries are designed to be short. Try them one by one in the LinkedIn **Posts** filter.")
 
 try:
-    st.toast("Loading AI model... (this may take a moment on first run)")
-    generator = load_model()
+    # start loading the model; the page renders while it loads
+    model_loading = start_model_loading()
+    generator = model_loading.result() if model_loading.done() else None
+    if generator is None:
+        st.toast("Loading AI model in the background... built-in related roles are used until it is ready")
 
     job_title = st.text_input("Enter your desired job title:", "Python Developer")
 
@@ -136,13 +129,18 @@ try:
         else:
             with st.spinner("🧠 Asking AI for related roles..."):
 
-                synonyms = get_synonyms_from_llm(job_title, generator)
+                if generator is not None:
+                    synonyms = get_synonyms_from_llm(job_title, generator)
+                    found_label = "AI found these related roles (limited to 3):"
+                else:
+                    synonyms = static_synonyms(job_title)
+                    found_label = "Built-in related roles (the AI model is still loading):"
 
                 if synonyms:
-                    st.subheader("AI found these related roles (limited to 3):")
+                    st.subheader(found_label)
                     st.write(", ".join(synonyms))
                 else:
-                    st.warning(f"The AI didn't return usable synonyms. Building queries with the main title only.")
+                    st.warning(f"No usable synonyms were found. Building queries with the main title only.")
 
                 st.subheader("Here is your constraint-aware query list:")
 
@@ -0,0 +1,159 @@
+'''
+In-process metrics for the backend: counters, gauges and histograms, with
+optional labels. Each uvicorn worker keeps its own set.
+
+GET /stats returns them as flat JSON; GET /metrics renders them in the
+Prometheus text exposition format, so any scraper can collect them without a
+separate exporter.
+'''
+import math
+from collections import defaultdict
+
+PREFIX = "querygen_"
+
+# seconds; covers a Redis round trip up to a slow LLM call
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+_counters = defaultdict(int)
+_gauges = {}
+_histograms = {}
+
+
+class Histogram:
+    '''
+    Cumulative-bucket histogram, as Prometheus expects it.
+    '''
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, amount=1, labels=None):
+    '''
+    Increments a counter
+    :param name: counter name
+    :param amount: value to add
+    :param labels: optional dict of label values
+    '''
+    _counters[_key(name, labels)] += amount
+
+
+def set_gauge(name, value, labels=None):
+    '''
+    Records the current value of something that goes up and down
+    :param name: gauge name
+    :param value: current value
+    :param labels: optional dict of label values
+    '''
+    _gauges[_key(name, labels)] = value
+
+
+def add_gauge(name, amount, labels=None):
+    '''
+    Moves a gauge up or down by amount
+    '''
+    key = _key(name, labels)
+    _gauges[key] = _gauges.get(key, 0) + amount
+
+
+def observe(name, value, labels=None, buckets=LATENCY_BUCKETS):
+    '''
+    Records one sample of a distribution
+    :param name: histogram name
+    :param value: sample
+    :param labels: optional dict of label values
+    :param buckets: bucket upper bounds, used when the histogram is first seen
+    '''
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram(buckets)
+    histogram.observe(value)
+
+
+def _flat_name(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def snapshot():
+    '''
+    :return: flat dict of every metric; histograms appear as <name>_count,
+        <name>_sum and <name>_max
+    '''
+    stats = {}
+    for (name, labels), value in _counters.items():
+        stats[_flat_name(name, labels)] = value
+    for (name, labels), value in _gauges.items():
+        stats[_flat_name(name, labels)] = value
+    for (name, labels), histogram in _histograms.items():
+        stats[_flat_name(f"{name}_count", labels)] = histogram.count
+        stats[_flat_name(f"{name}_sum", labels)] = histogram.sum
+        stats[_flat_name(f"{name}_max", labels)] = histogram.max
+    return stats
+
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    '''
+    :return: all metrics in the Prometheus text exposition format (0.0.4)
+    '''
+    lines = []
+
+    def grouped(items):
+        groups = defaultdict(list)
+        for (name, labels), value in sorted(items, key=lambda item: item[0]):
+            groups[name].append((labels, value))
+        return groups.items()
+
+    for name, series in grouped(_counters.items()):
+        lines.append(f"# TYPE {PREFIX}{name}_total counter")
+        for labels, value in series:
+            lines.append(f"{PREFIX}{name}_total{_labels_text(labels)} {_number(value)}")
+    for name, series in grouped(_gauges.items()):
+        lines.append(f"# TYPE {PREFIX}{name} gauge")
+        for labels, value in series:
+            lines.append(f"{PREFIX}{name}{_labels_text(labels)} {_number(value)}")
+    for name, series in grouped(_histograms.items()):
+        lines.append(f"# TYPE {PREFIX}{name} histogram")
+        for labels, histogram in series:
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                le = _labels_text(labels, [("le", _number(float(bound)))])
+                lines.append(f"{PREFIX}{name}_bucket{le} {count}")
+            le = _labels_text(labels, [("le", "+Inf")])
+            lines.append(f"{PREFIX}{name}_bucket{le} {histogram.count}")
+            lines.append(f"{PREFIX}{name}_sum{_labels_text(labels)} {_number(histogram.sum)}")
+            lines.append(f"{PREFIX}{name}_count{_labels_text(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
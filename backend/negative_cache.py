@@ -0,0 +1,163 @@
+'''
+Negative cache: titles the LLM had no usable synonyms for.
+
+They are remembered in Redis (a "neg:" key per title, with a TTL shorter
+than the synonym cache's) and in a per-worker Bloom filter, so a repeat is
+answered in microseconds with neither a Redis GET nor an LLM call, and junk
+never reaches the synonym cache. Workers share new entries through the
+invalidation channel and load the existing ones at startup.
+
+A Bloom filter cannot forget, so entries expire by generation: titles go
+into the current filter, lookups check it and the previous one, and every
+half ttl the previous one is dropped. A worker therefore remembers an entry
+for between half the ttl and the ttl, never longer than Redis does. A false
+positive makes a real title look like junk; a sample of the filter's
+answers is checked against Redis to measure how often that happens.
+'''
+import hashlib
+import logging
+import math
+import random
+import time
+
+from redis.exceptions import RedisError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "neg:"
+
+
+class BloomFilter:
+    '''
+    :param capacity: number of items the filter is sized for
+    :param error_rate: false positive rate at capacity
+    '''
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        # a generator, so a lookup stops at the first unset bit
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        new = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+
+    def __contains__(self, item):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def false_positive_rate(self):
+        '''
+        :return: expected false positive rate at the current fill
+        '''
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class NegativeCache:
+    '''
+    :param ttl_seconds: how long a title stays negative in Redis; each
+        Bloom filter generation lasts half of it
+    :param capacity: titles one generation is sized for
+    :param error_rate: false positive rate of a full generation
+    :param verify_rate: fraction of positive answers checked against Redis
+        in the background to measure false positives
+    '''
+
+    def __init__(self, ttl_seconds, capacity=100_000, error_rate=0.001, verify_rate=0.01,
+                 clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.verify_rate = verify_rate
+        self._clock = clock
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = clock()
+
+    def _rotate(self):
+        if self._clock() - self._rotated_at >= self.ttl_seconds / 2:
+            self._previous, self._current = self._current, BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = self._clock()
+            metrics.inc("negative_bloom_rotations")
+
+    def __contains__(self, title):
+        self._rotate()
+        return title in self._current or title in self._previous
+
+    def add(self, title):
+        '''
+        Remembers title in this worker's filter only
+        '''
+        self._rotate()
+        self._current.add(title)
+        metrics.set_gauge("negative_bloom_entries", self._current.count)
+        metrics.set_gauge("negative_bloom_fp_estimate", self.false_positive_rate())
+
+    def false_positive_rate(self):
+        '''
+        :return: expected false positive rate of a lookup now
+        '''
+        current, previous = self._current.false_positive_rate(), self._previous.false_positive_rate()
+        return 1 - (1 - current) * (1 - previous)
+
+    def should_verify(self):
+        return random.random() < self.verify_rate
+
+    def store(self, pipe, title):
+        '''
+        Remembers title as negative in this worker's filter, and queues the
+        Redis write on pipe
+        :param pipe: redis.asyncio pipeline, executed by the caller
+        :param title: canonical job title
+        '''
+        self.add(title)
+        metrics.inc("negative_cache_stores")
+        pipe.set(PREFIX + title, "1", ex=max(1, int(self.ttl_seconds)))
+
+    async def verify(self, client, title):
+        '''
+        Checks a positive answer against Redis and counts it if it was false
+        :param client: redis.asyncio client
+        :param title: canonical job title the filter reported as negative
+        '''
+        try:
+            negative = await client.exists(PREFIX + title)
+        except RedisError:
+            return
+        metrics.inc("negative_bloom_checks")
+        if not negative:
+            metrics.inc("negative_bloom_false_positives")
+
+    async def load(self, client, batch_size=1000):
+        '''
+        Adds the negative titles already in Redis to this worker's filter
+        :param client: redis.asyncio client
+        :return: number of titles added
+        '''
+        added = 0
+        try:
+            async for key in client.scan_iter(match=PREFIX + "*", count=batch_size):
+                self.add(key[len(PREFIX):])
+                added += 1
+        except RedisError:
+            logger.warning("could not load negative cache entries", exc_info=True)
+        return added
@@ -0,0 +1,458 @@
+'''
+Synonym providers: where alternate job titles come from.
+
+Every provider answers the same two calls,
+
+    await provider.synonyms(title)          -> list of alternate titles
+    await provider.synonyms_batch(titles)   -> dict title -> list, for the
+                                               titles it could answer
+
+GeminiProvider asks Gemini (one prompt per title, or one multi-title prompt
+per batch) for JSON matching a response schema, with a hard cap on output
+tokens and greedy decoding. LocalModelProvider runs a flan-t5 text2text model on the
+CPU, generating a whole batch of titles per forward pass on a dedicated
+worker thread, optionally int8-quantized or through ONNX Runtime. It needs no
+API key or network once the weights are downloaded.
+
+Heavy SDKs (google.generativeai, torch, transformers) are imported on first
+use rather than at import time, so the server starts and answers health
+checks without paying for them.
+
+Whatever a provider generates is validated here, once (see usable_synonyms):
+at most SYNONYMS_PER_TITLE job titles of at most MAX_SYNONYM_CHARS each,
+without the input title or repeats.
+'''
+import asyncio
+import functools
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from canonical import canonical_key
+from title_filter import usable_synonyms
+
+# alternate titles asked for, and kept, per job title
+SYNONYMS_PER_TITLE = 4
+# anything longer is the model rambling, not a job title
+MAX_SYNONYM_CHARS = 50
+
+_SPLIT_RE = re.compile(r"[,\n]")
+
+
+def clean_synonyms(raw_text, job_title, count=SYNONYMS_PER_TITLE):
+    '''
+    Cleans raw model output into a list of alternate titles: splits on commas
+    and newlines, title-cases, and keeps the first count usable ones
+    :param raw_text: generated text
+    :param job_title: title the synonyms were asked for
+    :param count: most synonyms to keep
+    :return: unique synonyms, in the order generated
+    '''
+    candidates = [candidate.strip().title() for candidate in _SPLIT_RE.split(raw_text)]
+    return usable_synonyms(job_title, candidates, count, MAX_SYNONYM_CHARS)
+
+
+def synonym_list_schema(count=SYNONYMS_PER_TITLE):
+    '''
+    :return: Gemini response schema of one title's alternate names
+    '''
+    return {"type": "array", "items": {"type": "string"}, "max_items": count}
+
+
+class UnparseableOutputError(ValueError):
+    '''Raised when a model's answer does not match the requested schema.'''
+
+
+class ProviderNotReadyError(Exception):
+    '''Raised instead of calling a provider whose model is still loading.'''
+
+
+@functools.cache
+def load_genai():
+    '''
+    Imports and configures the Gemini SDK, once per process
+    :return: the google.generativeai module
+    '''
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.getenv("GENAI_API_KEY"))
+    return genai
+
+
+def _load_json(text):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1:] if "\n" in text else ""
+    return json.loads(text)
+
+
+def parse_list_response(text, title, count=SYNONYMS_PER_TITLE):
+    '''
+    Parses the JSON array returned for a single-title prompt
+    :param text: raw LLM output
+    :param title: title that was asked for
+    :param count: most synonyms to keep
+    :return: its usable alternate names, possibly none
+    :raises UnparseableOutputError: the output is not a JSON array, e.g.
+        cut off at the token cap; the title is not junk just because of it
+    '''
+    try:
+        parsed = _load_json(text)
+    except json.JSONDecodeError as e:
+        raise UnparseableOutputError(f"LLM output for {title!r} is not JSON") from e
+    if not isinstance(parsed, list):
+        raise UnparseableOutputError(f"LLM output for {title!r} is not a list")
+    return usable_synonyms(title, parsed, count, MAX_SYNONYM_CHARS)
+
+
+def parse_batch_response(text, titles, count=SYNONYMS_PER_TITLE):
+    '''
+    Parses the JSON object returned for a multi-title prompt
+    :param text: raw LLM output, possibly wrapped in a markdown code fence
+    :param titles: titles that were asked for
+    :param count: most synonyms to keep per title
+    :return: dict title -> list of usable alternate names; titles missing
+        from the output or with a value that is not a list are left out
+    '''
+    try:
+        parsed = _load_json(text)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    by_key = {canonical_key(str(k)): v for k, v in parsed.items()}
+    results = {}
+    for title in titles:
+        value = by_key.get(canonical_key(title))
+        if isinstance(value, list):
+            results[title] = usable_synonyms(title, value, count, MAX_SYNONYM_CHARS)
+    return results
+
+
+def finish_reason(response):
+    '''
+    :return: why generation stopped ("STOP", "MAX_TOKENS", ...), or None
+    '''
+    candidates = getattr(response, "candidates", None)
+    if not candidates:
+        return None
+    reason = getattr(candidates[0], "finish_reason", None)
+    return getattr(reason, "name", reason)
+
+
+class GeminiProvider:
+    '''
+    Synonyms from Gemini. One model client is created per process, on first
+    use or by start(), and reused for every call.
+
+    Every call asks for JSON matching a response schema (a list per title),
+    at temperature 0, and may generate at most output_tokens_per_title
+    tokens per title asked for. Prompt and completion tokens are recorded per
+    call.
+
+    :param generate: coroutine function (prompt, generation config dict) ->
+        Gemini-like response (with .text and optionally .usage_metadata and
+        .candidates); defaults to calling the model
+    :param model: Gemini model name. Thinking models count their thoughts
+        against the output token cap, so use one that does not think by
+        default, or raise the cap.
+    :param output_tokens_per_title: output token budget per title
+    :param count: alternate names asked for per title
+    '''
+    name = "gemini"
+    # a second attempt only costs tokens, so slow calls may be hedged
+    hedge = True
+
+    def __init__(self, generate=None, model="gemini-2.5-flash-lite", output_tokens_per_title=48,
+                 count=SYNONYMS_PER_TITLE):
+        self.generate = generate or self._generate_with_client
+        self.model = model
+        self.output_tokens_per_title = output_tokens_per_title
+        self.count = count
+        self._client = None
+
+    @property
+    def ready(self):
+        '''
+        True once the client exists, so no request pays for the SDK import
+        on the event loop
+        '''
+        return self._client is not None or self.generate != self._generate_with_client
+
+    async def start(self):
+        '''
+        Imports the SDK and creates the client off the event loop
+        '''
+        if not self.ready:
+            await asyncio.to_thread(self.client)
+
+    async def close(self):
+        pass
+
+    def client(self):
+        if self._client is None:
+            self._client = load_genai().GenerativeModel(self.model)
+        return self._client
+
+    async def _generate_with_client(self, prompt, config):
+        return await self.client().generate_content_async(prompt, generation_config=config)
+
+    def generation_config(self, schema, titles):
+        '''
+        :param schema: response schema
+        :param titles: number of titles asked for
+        :return: generation config of one call
+        '''
+        return {
+            "response_mime_type": "application/json",
+            "response_schema": schema,
+            "max_output_tokens": self.output_tokens_per_title * titles,
+            "temperature": 0,
+            "candidate_count": 1,
+        }
+
+    async def synonyms(self, title):
+        prompt = f"""
+    List at most {self.count} alternative professional job titles that mean the same as '{title}', as used in job postings.
+    Answer with an empty list if it is not a job title.
+    """
+        config = self.generation_config(synonym_list_schema(self.count), 1)
+        response = await self._generate(prompt, config, "single")
+        return parse_list_response(response_text(response), title, self.count)
+
+    async def synonyms_batch(self, titles):
+        listed = "\n".join(f"- {t}" for t in titles)
+        prompt = f"""
+    For each job title below, list at most {self.count} alternative professional job titles that mean the same, as used in job postings.
+    Map each job title, exactly as written, to its list; use an empty list for anything that is not a job title.
+    Job titles:
+    {listed}
+    """
+        schema = {
+            "type": "object",
+            "properties": {title: synonym_list_schema(self.count) for title in titles},
+            "required": list(titles),
+        }
+        response = await self._generate(prompt, self.generation_config(schema, len(titles)), "batch")
+        return parse_batch_response(response_text(response), titles, self.count)
+
+    async def _generate(self, prompt, config, kind):
+        labels = {"kind": kind}
+        response = await self.generate(prompt, config)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = usage.prompt_token_count or 0
+            completion_tokens = usage.candidates_token_count or 0
+            metrics.inc("llm_prompt_tokens", prompt_tokens, labels)
+            metrics.inc("llm_completion_tokens", completion_tokens, labels)
+            metrics.observe("llm_prompt_tokens_per_call", prompt_tokens, labels, metrics.TOKEN_BUCKETS)
+            metrics.observe("llm_completion_tokens_per_call", completion_tokens, labels, metrics.TOKEN_BUCKETS)
+        if finish_reason(response) == "MAX_TOKENS":
+            # the JSON is cut off; the titles it misses fall back
+            metrics.inc("llm_output_truncated", labels=labels)
+        return response
+
+
+def response_text(response):
+    '''
+    :return: the response's text, "" if it has none (e.g. it was blocked)
+    '''
+    try:
+        return response.text
+    except ValueError:
+        return ""
+
+
+class LocalModelProvider:
+    '''
+    Synonyms from a local seq2seq model (flan-t5 by default) on the CPU.
+
+    All generation runs on one dedicated thread, so the event loop is never
+    blocked and calls are served one batch at a time; the micro-batcher in
+    front of it groups concurrent misses into a single batch.
+
+    :param model: Hugging Face model name or path
+    :param runtime: "torch", "int8" (dynamically quantized Linear layers) or
+        "onnx" (ONNX Runtime through optimum)
+    :param batch_size: prompts per forward pass
+    :param max_new_tokens: generation length per title
+    :param threads: torch intra-op threads, None for the torch default
+    '''
+    name = "local"
+    # a second attempt would queue behind the first on the same thread
+    hedge = False
+
+    def __init__(self, model="google/flan-t5-base", runtime="torch", batch_size=16,
+                 max_new_tokens=64, threads=None):
+        if runtime not in ("torch", "int8", "onnx"):
+            raise ValueError(f"unknown local model runtime: {runtime}")
+        self.model = model
+        self.runtime = runtime
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-model")
+        self._pipeline = None
+
+    @property
+    def ready(self):
+        '''
+        True once the model is loaded; calls made before then raise
+        ProviderNotReadyError rather than queue behind the load
+        '''
+        return self._pipeline is not None
+
+    async def start(self):
+        '''
+        Loads the model on the worker thread. The server runs this in the
+        background, so it starts serving before the weights are in memory.
+        '''
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._load)
+
+    async def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def synonyms(self, title):
+        return (await self.synonyms_batch([title])).get(title, [])
+
+    async def synonyms_batch(self, titles):
+        if not self.ready:
+            raise ProviderNotReadyError(f"{self.model} is still loading")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._generate, list(titles))
+
+    def _load(self):
+        if self._pipeline is not None:
+            return self._pipeline
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        tokenizer = AutoTokenizer.from_pretrained(self.model)
+        if self.runtime == "onnx":
+            try:
+                from optimum.onnxruntime import ORTModelForSeq2SeqLM
+            except ImportError as e:
+                raise RuntimeError('the onnx runtime needs optimum: pip install "optimum[onnxruntime]"') from e
+            model = ORTModelForSeq2SeqLM.from_pretrained(self.model, export=True)
+        else:
+            model = AutoModelForSeq2SeqLM.from_pretrained(self.model)
+            model.eval()
+            if self.runtime == "int8":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self._pipeline = pipeline("text2text-generation", model=model, tokenizer=tokenizer)
+        return self._pipeline
+
+    def _generate(self, titles):
+        metrics.inc("local_model_titles", len(titles))
+        return generate_local(self._load(), titles, self.batch_size, self.max_new_tokens)
+
+
+def local_prompt(title, count=SYNONYMS_PER_TITLE):
+    return f"""
+    Task: Generate a list of {count} common synonyms or related job titles for "{title}".
+    Format: A single line, comma-separated.
+    Titles:
+    """
+
+
+def generate_local(generator, titles, batch_size=16, max_new_tokens=64, count=SYNONYMS_PER_TITLE):
+    '''
+    Generates synonyms with a text2text-generation pipeline, greedily and
+    at most max_new_tokens per title. Also used by the Streamlit apps.
+    :param generator: transformers pipeline
+    :param titles: job titles
+    :param batch_size: prompts per forward pass
+    :param max_new_tokens: generation length per title
+    :param count: synonyms asked for and kept per title
+    :return: dict title -> synonyms, for the titles with usable ones
+    '''
+    outputs = generator(
+        [local_prompt(title, count) for title in titles],
+        batch_size=batch_size,
+        max_new_tokens=max_new_tokens,
+        do_sample=False,
+        num_return_sequences=1,
+    )
+    results = {}
+    for title, output in zip(titles, outputs):
+        # a list of prompts gives one list of sequences per prompt
+        if isinstance(output, list):
+            output = output[0]
+        synonyms = clean_synonyms(output["generated_text"], title, count)
+        if synonyms:
+            results[title] = synonyms
+    return results
+
+
+# the model of this worker process, see LocalModelProcessPool
+_process_provider = None
+
+
+def _load_in_process(local_options):
+    global _process_provider
+    _process_provider = LocalModelProvider(**local_options)
+    _process_provider._load()
+
+
+def _generate_in_process(titles):
+    return _process_provider._generate(titles)
+
+
+class LocalModelProcessPool:
+    '''
+    LocalModelProvider spread over worker processes, each with its own copy
+    of the model, for offline bulk generation (see bulk_generate.py), where
+    one process cannot keep every CPU core busy. Each process loads the
+    model once, when it starts.
+
+    :param processes: worker processes
+    :param local_options: LocalModelProvider arguments; set threads so that
+        processes * threads does not exceed the cores
+    '''
+    name = "local"
+    hedge = False
+    ready = True
+
+    def __init__(self, processes, **local_options):
+        self.processes = processes
+        self.local_options = local_options
+        self._executor = None
+
+    async def start(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes, initializer=_load_in_process, initargs=(self.local_options,)
+        )
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def synonyms(self, title):
+        return (await self.synonyms_batch([title])).get(title, [])
+
+    async def synonyms_batch(self, titles):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, _generate_in_process, list(titles))
+
+
+def make_provider(name, generate=None, gemini_model="gemini-2.5-flash-lite", output_tokens_per_title=48,
+                  **local_options):
+    '''
+    :param name: "gemini" or "local"
+    :param generate: Gemini generate function, for "gemini"; None calls
+        the Gemini API
+    :param gemini_model: Gemini model name, for "gemini"
+    :param output_tokens_per_title: Gemini output token budget per title
+    :param local_options: LocalModelProvider arguments, for "local"
+    :return: provider instance
+    '''
+    if name == "gemini":
+        return GeminiProvider(generate, gemini_model, output_tokens_per_title)
+    if name == "local":
+        return LocalModelProvider(**local_options)
+    raise ValueError(f"unknown LLM provider: {name}")
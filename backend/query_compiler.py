@@ -0,0 +1,222 @@
+'''
+Boolean search query compiler.
+
+Queries are built as small trees of Phrase, AnyOf (OR), AllOf (AND) and Not
+nodes. Each node knows its rendered text and how many boolean operators it
+uses, so a query can be checked exactly against a platform's limits
+(QueryBudget) before it is shown to the user.
+
+pack_queries spreads a list of job titles over as few queries as possible:
+
+    ("Software Engineer" OR "Backend Engineer") AND ("hiring" OR ...) AND NOT (...)
+    ("Full Stack Developer" OR "Programmer") AND ("hiring" OR ...) AND NOT (...)
+
+Every query carries the same constant clauses, so what is left of the budget
+after them is a bin that titles are packed into, first-fit decreasing. The
+constant clauses are nodes, compiled once by the caller and reused.
+'''
+
+
+class Node:
+    '''
+    Base of the query tree. Nodes are immutable; text and operators are
+    computed once, when the node is built.
+    '''
+    __slots__ = ("text", "operators", "terms")
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        return len(self.text)
+
+
+class Phrase(Node):
+    '''
+    Exact phrase, rendered in double quotes
+    '''
+    __slots__ = ()
+
+    def __init__(self, phrase):
+        # a quote inside the phrase would end it early
+        self.text = '"' + " ".join(phrase.replace('"', " ").split()) + '"'
+        self.operators = 0
+        self.terms = 1
+
+
+class _Group(Node):
+    __slots__ = ("children",)
+    operator = None
+
+    def __init__(self, children):
+        self.children = tuple(children)
+        if not self.children:
+            raise ValueError(f"{type(self).__name__} needs at least one clause")
+        joined = f" {self.operator} ".join(child.text for child in self.children)
+        # parenthesized so it can be nested in a group of another kind
+        self.text = joined if len(self.children) == 1 else f"({joined})"
+        self.operators = len(self.children) - 1 + sum(child.operators for child in self.children)
+        self.terms = sum(child.terms for child in self.children)
+
+
+class AnyOf(_Group):
+    __slots__ = ()
+    operator = "OR"
+
+
+class AllOf(_Group):
+    __slots__ = ()
+    operator = "AND"
+
+    def __init__(self, children):
+        super().__init__(children)
+        # the top-level AND needs no parentheses
+        if len(self.children) > 1:
+            self.text = self.text[1:-1]
+
+
+class Not(Node):
+    __slots__ = ("child",)
+
+    def __init__(self, child):
+        self.child = child
+        self.text = f"NOT {child.text}"
+        self.operators = child.operators + 1
+        self.terms = child.terms
+
+
+def any_of(phrases):
+    '''
+    :param phrases: strings
+    :return: AnyOf node of their phrases
+    '''
+    return AnyOf(Phrase(p) for p in phrases)
+
+
+class QueryBudget:
+    '''
+    Limits a search platform puts on one query.
+
+    :param max_chars: longest query, in characters
+    :param max_operators: most AND / OR / NOT operators in the whole query
+    :param max_or_terms: most alternatives in one OR group
+    '''
+
+    def __init__(self, max_chars, max_operators, max_or_terms):
+        self.max_chars = max_chars
+        self.max_operators = max_operators
+        self.max_or_terms = max_or_terms
+
+    def fits(self, query):
+        '''
+        :param query: Node
+        :return: True if the query is within every limit
+        '''
+        return (
+            len(query) <= self.max_chars
+            and query.operators <= self.max_operators
+            and all(len(group.children) <= self.max_or_terms for group in _or_groups(query))
+        )
+
+
+def _or_groups(node):
+    if isinstance(node, AnyOf):
+        yield node
+    if isinstance(node, _Group):
+        for child in node.children:
+            yield from _or_groups(child)
+    elif isinstance(node, Not):
+        yield from _or_groups(node.child)
+
+
+# LinkedIn's content search rejects or silently truncates longer queries and
+# gets unreliable past a handful of OR-ed terms; Google ignores words after
+# the 32nd.
+PLATFORM_BUDGETS = {
+    "linkedin": QueryBudget(max_chars=250, max_operators=9, max_or_terms=4),
+    "google": QueryBudget(max_chars=2048, max_operators=31, max_or_terms=31),
+}
+
+
+class _Bin:
+    __slots__ = ("titles", "chars", "operators")
+
+    def __init__(self):
+        self.titles = []
+        self.chars = 0
+        self.operators = 0
+
+
+def pack_queries(titles, budget, clause_options):
+    '''
+    Builds the fewest queries of the form
+    (title OR title ...) AND clause AND clause ...
+    that mention every title once and fit the budget.
+
+    :param titles: job titles, most important first; the first one always
+        leads the first query. Duplicates (ignoring case) are dropped.
+    :param budget: QueryBudget
+    :param clause_options: sequences of constant clause nodes, in order of
+        preference; the first one that leaves room for every title is used
+        in all queries
+    :return: list of query strings
+    :raises ValueError: a title does not fit the budget even on its own
+    '''
+    phrases = []
+    seen = set()
+    for title in titles:
+        phrase = Phrase(title)
+        if phrase.text.lower() not in seen and phrase.text != '""':
+            seen.add(phrase.text.lower())
+            phrases.append(phrase)
+    if not phrases:
+        return []
+
+    for clauses in clause_options:
+        clauses = tuple(clauses)
+        # what each query spends before any title: the clauses and the ANDs
+        # joining them to the title group
+        fixed_chars = sum(len(c) for c in clauses) + len(" AND ") * len(clauses)
+        fixed_operators = sum(c.operators for c in clauses) + len(clauses)
+        if fixed_operators > budget.max_operators:
+            continue
+        room_chars = budget.max_chars - fixed_chars
+        room_operators = budget.max_operators - fixed_operators
+        if all(len(p) <= room_chars for p in phrases):
+            break
+    else:
+        raise ValueError(f"a title does not fit in a {budget.max_chars}-character query")
+
+    def cost(bin, phrase):
+        # " OR " before every title but the first, and "(...)" once there are two
+        if not bin.titles:
+            return len(phrase), 0
+        return len(phrase) + len(" OR ") + (2 if len(bin.titles) == 1 else 0), 1
+
+    def place(phrase, bins):
+        for bin in bins:
+            chars, operators = cost(bin, phrase)
+            if (bin.chars + chars <= room_chars and bin.operators + operators <= room_operators
+                    and len(bin.titles) < budget.max_or_terms):
+                bin.titles.append(phrase)
+                bin.chars += chars
+                bin.operators += operators
+                return
+        bin = _Bin()
+        bins.append(bin)
+        place(phrase, [bin])
+
+    bins = []
+    place(phrases[0], bins)
+    # first-fit decreasing: the longest titles are the hardest to place
+    for phrase in sorted(phrases[1:], key=len, reverse=True):
+        place(phrase, bins)
+
+    queries = []
+    for bin in bins:
+        # the main title first, the rest in their original order
+        ordered = sorted(bin.titles, key=phrases.index)
+        query = AllOf((AnyOf(ordered), *clauses))
+        assert budget.fits(query), query.text
+        queries.append(query.text)
+    return queries
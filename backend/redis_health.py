@@ -0,0 +1,186 @@
+'''
+Redis client construction and availability tracking.
+
+make_redis_client builds the client from a URL with a bounded connection
+pool, socket timeouts, TCP keepalive and redis-py's idle-connection health
+checks:
+
+    redis://host:6379/0, rediss://..., unix:///path/redis.sock
+    redis+sentinel://sentinel1:26379,sentinel2:26379/mymaster/0
+    redis+cluster://node1:6379
+
+RedisHealth tracks whether Redis can be reached. A failed command marks it
+down at once; from then on callers skip the cache instead of waiting on
+timeouts, while a background loop PINGs until Redis answers again, then runs
+on_recover.
+'''
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def make_redis_client(url, max_connections, socket_timeout, connect_timeout, pool_timeout,
+                      health_check_interval):
+    '''
+    :param url: Redis URL; redis+sentinel:// and redis+cluster:// select
+        Sentinel and Cluster deployments
+    :param max_connections: connection pool size (per node for Cluster)
+    :param socket_timeout: seconds to wait for a reply
+    :param connect_timeout: seconds to wait for a connection
+    :param pool_timeout: seconds to wait for a free pooled connection
+    :param health_check_interval: connections idle this long are PINGed
+        before reuse
+    :return: redis.asyncio client
+    '''
+    options = {
+        "decode_responses": True,
+        "socket_timeout": socket_timeout,
+        "socket_connect_timeout": connect_timeout,
+        "socket_keepalive": True,
+        "health_check_interval": health_check_interval,
+    }
+    scheme = urlsplit(url).scheme
+    if scheme == "redis+sentinel":
+        from redis.asyncio.sentinel import Sentinel
+
+        hosts, service, db = _parse_sentinel_url(url)
+        sentinel = Sentinel(hosts, socket_timeout=socket_timeout, socket_connect_timeout=connect_timeout)
+        return sentinel.master_for(service, redis_class=aioredis.Redis, db=db,
+                                   max_connections=max_connections, **options)
+    if scheme == "redis+cluster":
+        from redis.asyncio.cluster import RedisCluster
+
+        return RedisCluster.from_url("redis" + url[len("redis+cluster"):],
+                                     max_connections=max_connections, **options)
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url, max_connections=max_connections, timeout=pool_timeout, **options
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+def _parse_sentinel_url(url):
+    '''
+    :param url: redis+sentinel://host:port[,host:port...]/service[/db]
+    :return: ([(host, port), ...], service name, db number)
+    '''
+    parts = urlsplit(url)
+    hosts = []
+    for host in parts.netloc.rsplit("@", 1)[-1].split(","):
+        name, _, port = host.partition(":")
+        hosts.append((name, int(port or 26379)))
+    path = [p for p in parts.path.split("/") if p]
+    if not path:
+        raise ValueError(f"no Sentinel service name in {url!r}")
+    return hosts, path[0], int(path[1]) if len(path) > 1 else 0
+
+
+def is_cluster(client):
+    return type(client).__name__ == "RedisCluster"
+
+
+def record_pool_metrics(client):
+    '''
+    Sets the connection pool gauges (in use, idle, max). Cluster clients
+    keep one pool per node and are not reported.
+    '''
+    pool = getattr(client, "connection_pool", None)
+    in_use = getattr(pool, "_in_use_connections", None)
+    if in_use is None:
+        return
+    idle = [c for c in getattr(pool, "_available_connections", ()) if c is not None]
+    metrics.set_gauge("redis_pool_connections", len(in_use), {"state": "in_use"})
+    metrics.set_gauge("redis_pool_connections", len(idle), {"state": "idle"})
+    metrics.set_gauge("redis_pool_max_connections", pool.max_connections)
+
+
+class RedisHealth:
+    '''
+    Whether Redis is reachable, kept current by run().
+
+    :param client: redis.asyncio client, or a zero-argument function
+        returning it (so the client can be swapped out)
+    :param check_interval: seconds between PINGs while Redis is up
+    :param retry_interval: seconds between reconnect attempts while it is down
+    :param timeout: seconds a PING may take
+    :param on_recover: coroutine function run in the background each time
+        Redis is reachable again, e.g. to reload what could not be loaded
+        while it was down
+    '''
+
+    def __init__(self, client, check_interval, retry_interval, timeout, on_recover=None):
+        self._client = client if callable(client) else (lambda: client)
+        self.check_interval = check_interval
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.on_recover = on_recover
+        self.available = True
+        self._down = asyncio.Event()
+        self._recovery = None
+        metrics.set_gauge("redis_up", 1)
+
+    def mark_down(self, error=None):
+        '''
+        Called when a command fails: callers skip Redis until run() reconnects
+        '''
+        if not self.available:
+            return
+        logger.warning("Redis unreachable, serving without the cache until it is back: %s", error)
+        self.available = False
+        metrics.inc("redis_down")
+        metrics.set_gauge("redis_up", 0)
+        self._down.set()
+
+    def _mark_up(self):
+        if self.available:
+            return
+        logger.info("Redis reachable again")
+        self.available = True
+        metrics.inc("redis_reconnects")
+        metrics.set_gauge("redis_up", 1)
+        if self.on_recover is not None and (self._recovery is None or self._recovery.done()):
+            self._recovery = asyncio.ensure_future(self._recover())
+
+    async def _recover(self):
+        try:
+            await self.on_recover()
+        except Exception:
+            logger.exception("reloading from Redis after it came back failed")
+
+    async def check(self):
+        '''
+        PINGs Redis once and updates available
+        :return: True if Redis answered
+        '''
+        try:
+            await asyncio.wait_for(self._client().ping(), self.timeout)
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self.mark_down(e)
+            return False
+        self._mark_up()
+        return True
+
+    async def run(self):
+        '''
+        Checks Redis every check_interval while it is up, and every
+        retry_interval while it is down. Runs until cancelled.
+        '''
+        while True:
+            if self.available:
+                self._down.clear()
+                try:
+                    # woken early when a request sees Redis fail
+                    await asyncio.wait_for(self._down.wait(), self.check_interval)
+                    await asyncio.sleep(self.retry_interval)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(self.retry_interval)
+            await self.check()
+            record_pool_metrics(self._client())
@@ -0,0 +1,214 @@
+'''
+Keeps LLM slowdowns and outages from turning into unbounded request latency.
+
+ResilientCaller wraps a coroutine function with
+  - a per-call deadline,
+  - an optional hedged second attempt once the first has run longer than a
+    recent latency percentile,
+  - a circuit breaker that opens on a high error rate or slow-call rate and
+    then fails calls immediately until a trial call succeeds.
+'''
+import asyncio
+import time
+from collections import deque
+
+import metrics
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    '''Raised instead of calling while the circuit breaker is open.'''
+
+
+class CircuitBreaker:
+    '''
+    Rolling-window circuit breaker.
+
+    Opens when, over the last window seconds and at least min_calls calls,
+    the share of failures reaches error_rate or the share of calls slower
+    than slow_call_seconds reaches slow_rate. After open_seconds one trial
+    call is let through (half-open); its outcome closes or re-opens it.
+    '''
+
+    def __init__(self, name, window=60, min_calls=10, error_rate=0.5,
+                 slow_call_seconds=10, slow_rate=0.8, open_seconds=30, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._calls = deque()  # (time, failed, slow)
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.state = CLOSED
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge("circuit_state", _STATE_VALUES[self.state], {"breaker": self.name})
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            metrics.inc("circuit_transitions", labels={"breaker": self.name, "to": state})
+            self._publish()
+
+    def allow(self):
+        '''
+        :return: True if a call may go ahead now
+        '''
+        if self.state == OPEN:
+            if self._clock() - self._opened_at < self.open_seconds:
+                return False
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._trial_running:
+                return False
+            self._trial_running = True
+        return True
+
+    def record(self, failed, seconds):
+        '''
+        :param failed: whether the call raised or timed out
+        :param seconds: how long the call took
+        '''
+        now = self._clock()
+        if self.state == HALF_OPEN:
+            self._trial_running = False
+            if failed or seconds >= self.slow_call_seconds:
+                self._open(now)
+            else:
+                self._calls.clear()
+                self._set_state(CLOSED)
+            return
+
+        self._calls.append((now, failed, seconds >= self.slow_call_seconds))
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for _, f, _ in self._calls if f)
+        slow = sum(1 for _, _, s in self._calls if s)
+        if failures / total >= self.error_rate or slow / total >= self.slow_rate:
+            self._open(now)
+
+    def abandon(self):
+        '''
+        Forgets a call that was cancelled before it finished; it counts neither
+        as a success nor as a failure.
+        '''
+        self._trial_running = False
+
+    def _open(self, now):
+        self._opened_at = now
+        self._calls.clear()
+        self._set_state(OPEN)
+
+
+class LatencyTracker:
+    '''
+    Keeps the last `size` latencies to estimate a percentile.
+    '''
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, p, min_samples=20):
+        '''
+        :return: p-th percentile in seconds, or None with too few samples
+        '''
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class ResilientCaller:
+    '''
+    Calls fn() with a deadline, hedging and a circuit breaker.
+
+    :param timeout: deadline per call in seconds (covers the hedge as well)
+    :param hedge_percentile: start a second attempt once the first has run
+        longer than this percentile of recent latencies; 0 disables hedging
+    :param hedge_slots: asyncio.Semaphore bounding the calls in flight, held
+        by the caller for the first attempt; a hedge takes a slot of its own,
+        and is skipped rather than queued if none is free. None leaves
+        hedges unbounded.
+    '''
+
+    def __init__(self, name, breaker, timeout=10.0, hedge_percentile=95, hedge_slots=None):
+        self.name = name
+        self.breaker = breaker
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_slots = hedge_slots
+        self.latencies = LatencyTracker()
+
+    async def call(self, fn, hedge=True):
+        '''
+        :param fn: zero-argument coroutine function making the call
+        :param hedge: allow a hedged second attempt for this call
+        :return: fn's result
+        :raises CircuitOpenError: breaker is open
+        :raises asyncio.TimeoutError: no attempt finished within the deadline
+        '''
+        if not self.breaker.allow():
+            metrics.inc("circuit_rejections", labels={"breaker": self.name})
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._attempt(fn, hedge), self.timeout)
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.inc("call_timeouts", labels={"breaker": self.name})
+            self.breaker.record(True, time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        self.breaker.record(False, elapsed)
+        self.latencies.add(elapsed)
+        return result
+
+    async def _attempt(self, fn, hedge):
+        hedge_after = self.latencies.percentile(self.hedge_percentile) if hedge and self.hedge_percentile else None
+        tasks = [asyncio.ensure_future(fn())]
+        hedge_slot = False
+        try:
+            if hedge_after is None:
+                return await tasks[0]
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                if self.hedge_slots is None or not self.hedge_slots.locked():
+                    if self.hedge_slots is not None:
+                        # free, so this does not wait
+                        await self.hedge_slots.acquire()
+                        hedge_slot = True
+                    metrics.inc("call_hedges", labels={"breaker": self.name})
+                    tasks.append(asyncio.ensure_future(fn()))
+                else:
+                    metrics.inc("call_hedges_skipped", labels={"breaker": self.name})
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # every attempt failed; raise the first one's error
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            if hedge_slot:
+                self.hedge_slots.release()
@@ -0,0 +1,107 @@
+'''
+Finds the dictionary roles mentioned in a job title.
+
+RoleMatcher compiles a title -> synonyms dictionary into an Aho-Corasick
+automaton over words, once. Matching tokenizes the canonical form of the
+input (see canonical.py) and finds every dictionary role in it in a single
+pass, so the cost depends on the length of the input, not on the size of
+the dictionary:
+
+    "Senior Cloud Data Engineers" -> "data engineer"
+    "python backend developer"    -> "backend developer"
+
+Only whole words match, so "java" does not match "javascript developer".
+When several roles match, the most specific one wins: the one with the most
+words, then the one ending last (titles end in their head noun, as in "data
+scientist" over "data engineer" in "data engineer turned data scientist"),
+then the one listed first in the dictionary.
+'''
+from canonical import canonical_key
+
+
+class RoleMatcher:
+    '''
+    :param table: dict of role -> synonyms; roles are matched by their
+        canonical form, and the first of several roles with the same
+        canonical form is kept
+    '''
+
+    def __init__(self, table):
+        # state 0 is the root; goto[state] maps a word to the next state
+        self._goto = [{}]
+        self._fail = [0]
+        # roles ending at each state, via failure links included, as
+        # (word count, role index)
+        self._output = [[]]
+        self._roles = []
+        self._synonyms = []
+        seen = set()
+        for role, synonyms in table.items():
+            key = canonical_key(role)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            self._add(key.split(" "), len(self._roles))
+            self._roles.append(key)
+            self._synonyms.append(synonyms)
+        self._link()
+
+    def __len__(self):
+        return len(self._roles)
+
+    def _add(self, words, index):
+        state = 0
+        for word in words:
+            next_state = self._goto[state].get(word)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][word] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(words), index))
+
+    def _link(self):
+        # breadth-first, so a state's failure target is complete before it
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                self._output[child].extend(self._output[self._fail[child]])
+
+    def _scan(self, title):
+        '''
+        Runs the automaton over the words of title
+        :return: generator of (word count, end word, -role index) per match
+        '''
+        state = 0
+        for end, word in enumerate(canonical_key(title).split(" "), 1):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for length, index in self._output[state]:
+                # negated so that, of equal matches, the first role ranks highest
+                yield length, end, -index
+
+    def matches(self, title):
+        '''
+        :param title: raw job title
+        :return: list of (role, start word, end word) for every dictionary
+            role in title, most specific first
+        '''
+        found = sorted(self._scan(title), reverse=True)
+        return [(self._roles[-index], end - length, end) for length, end, index in found]
+
+    def lookup(self, title):
+        '''
+        :param title: raw job title
+        :return: synonyms of the most specific role in title, or None if it
+            mentions none
+        '''
+        best = max(self._scan(title), default=None)
+        return None if best is None else self._synonyms[-best[2]]
@@ -0,0 +1,52 @@
+'''
+Static job title -> synonyms maps, shared by the FastAPI server, the
+Streamlit apps and the cache warmer.
+'''
+from canonical import canonical_key
+from role_matcher import RoleMatcher
+
+# Hand-picked synonyms for the FastAPI backend (server.py)
+ROLE_SYNONYMS = {
+  "software developer": [
+    "software engineer",
+    "backend engineer",
+    "full stack developer",
+    "application developer",
+  ],
+  "data scientist": [
+    "machine learning engineer",
+    "ai engineer",
+    "data analyst",
+    "research scientist",
+  ],
+  "systems engineer": [
+    "devops engineer",
+    "site reliability engineer",
+    "infrastructure engineer",
+  ]
+}
+
+# Larger dictionary used by the rule-based Streamlit app (main2.py)
+SYNONYM_MAP = {
+    "software engineer": ["Software Developer", "Backend Engineer", "Full Stack Developer", "Developer", "Programmer"],
+    "python developer": ["Python Engineer", "Backend Engineer", "Software Engineer (Python)", "Data Engineer"],
+    "python engineer": ["Python Developer", "Backend Engineer", "Software Engineer (Python)", "Data Engineer"],
+    "data scientist": ["Data Analyst", "Machine Learning Engineer", "ML Engineer", "Business Intelligence Analyst"],
+    "data engineer": ["Data Architect", "Pipeline Developer", "ETL Developer", "Big Data Engineer"],
+    "frontend developer": ["Frontend Engineer", "UI Developer", "React Developer", "Web Developer"],
+    "backend developer": ["Backend Engineer", "Software Engineer", "Python Developer", "Java Developer"],
+    "full stack developer": ["Full Stack Engineer", "Software Engineer", "Web Developer"],
+    "machine learning engineer": ["ML Engineer", "Data Scientist", "AI Engineer", "Computer Vision Engineer"],
+    "devops engineer": ["SRE", "Site Reliability Engineer", "Platform Engineer", "Cloud Engineer"],
+    "product manager": ["PM", "Technical Product Manager", "Product Owner"]
+}
+
+# Both maps by cache key (see canonical.py); ROLE_SYNONYMS wins where they overlap.
+STATIC_SYNONYMS = {
+    canonical_key(title): synonyms
+    for table in (SYNONYM_MAP, ROLE_SYNONYMS)
+    for title, synonyms in table.items()
+}
+
+# Finds the most specific STATIC_SYNONYMS role within a longer title
+ROLE_MATCHER = RoleMatcher(STATIC_SYNONYMS)
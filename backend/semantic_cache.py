@@ -0,0 +1,290 @@
+'''
+Semantic cache for near-duplicate job titles.
+
+Titles are embedded and stored in a vector index next to their synonyms. On
+an exact-key miss, the nearest stored title is looked up and its synonyms are
+reused if it is similar enough, saving an LLM call for phrasings like
+"Sr Python Dev" vs "Senior Python Developer".
+
+Two interchangeable indexes are provided: RedisVectorIndex (RediSearch, needs
+redis-stack) and InMemoryVectorIndex (NumPy, per process).
+'''
+import hashlib
+import json
+import logging
+import re
+
+import numpy as np
+from redis.commands.search.field import TextField, VectorField
+from redis.commands.search.query import Query
+from redis.exceptions import RedisError, ResponseError
+
+try:
+    from redis.commands.search.index_definition import IndexDefinition, IndexType
+except ImportError:  # redis < 6
+    from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+
+import metrics
+from providers import load_genai
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# -----embedders------
+class HashingEmbedder:
+    '''
+    Offline embedder: hashes words and character trigrams into a fixed-size
+    vector. Fast and deterministic, good enough to catch spelling and word
+    order variations without any network call.
+    '''
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _features(self, text):
+        words = _TOKEN_RE.findall(text.lower())
+        for word in words:
+            yield word, 1.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    async def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign * weight
+        return _normalize(vector)
+
+
+class GeminiEmbedder:
+    '''
+    Embeds titles with the Gemini embedding API.
+    '''
+
+    def __init__(self, model="models/text-embedding-004", dim=768):
+        self.model = model
+        self.dim = dim
+
+    async def embed(self, text):
+        genai = load_genai()
+        result = await genai.embed_content_async(
+            model=self.model, content=text, task_type="SEMANTIC_SIMILARITY"
+        )
+        return _normalize(np.asarray(result["embedding"], dtype=np.float32))
+
+
+def _normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# -----indexes------
+class InMemoryVectorIndex:
+    '''
+    Brute-force cosine index held in a NumPy matrix. Same interface as
+    RedisVectorIndex; used when redis-stack is not available.
+    '''
+
+    def __init__(self, dim, max_size=50000):
+        self.dim = dim
+        self.max_size = max_size
+        self._vectors = np.zeros((min(max_size, 1024), dim), dtype=np.float32)
+        self._titles = []
+        self._synonyms = []
+        self._positions = {}
+        # once full, slots are reused oldest first
+        self._next_evict = 0
+
+    async def ensure(self):
+        pass
+
+    async def add(self, title, vector, synonyms):
+        position = self._positions.get(title)
+        if position is None:
+            if len(self._titles) < self.max_size:
+                position = len(self._titles)
+                if position == len(self._vectors):
+                    grown = np.zeros((min(2 * position, self.max_size), self.dim), dtype=np.float32)
+                    grown[:position] = self._vectors
+                    self._vectors = grown
+                self._titles.append(title)
+                self._synonyms.append(synonyms)
+            else:
+                position = self._next_evict
+                self._next_evict = (position + 1) % self.max_size
+                del self._positions[self._titles[position]]
+                self._titles[position] = title
+            self._positions[title] = position
+        self._vectors[position] = vector
+        self._synonyms[position] = synonyms
+
+    async def knn(self, vector, k=1):
+        '''
+        :param vector: normalized query vector
+        :param k: number of neighbours
+        :return: list of (title, similarity, synonyms), most similar first
+        '''
+        count = len(self._titles)
+        if not count:
+            return []
+        scores = self._vectors[:count] @ vector
+        k = min(k, count)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self._titles[i], float(scores[i]), self._synonyms[i]) for i in best]
+
+    def __len__(self):
+        return len(self._titles)
+
+
+class RedisVectorIndex:
+    '''
+    RediSearch vector index over hashes "<prefix><title>" holding the title,
+    its synonyms (JSON) and its embedding.
+    '''
+
+    def __init__(self, client, dim, name="idx:titles", prefix="semantic:",
+                 algorithm="HNSW", ttl=None):
+        self.client = client
+        self.dim = dim
+        self.name = name
+        self.prefix = prefix
+        self.algorithm = algorithm
+        self.ttl = ttl
+
+    async def ensure(self):
+        '''
+        Creates the index if it does not exist yet. Raises ResponseError if the
+        server has no search module.
+        '''
+        search = self.client.ft(self.name)
+        try:
+            await search.info()
+            return
+        except ResponseError:
+            pass
+        schema = (
+            TextField("title"),
+            VectorField(
+                "embedding",
+                self.algorithm,
+                {"TYPE": "FLOAT32", "DIM": self.dim, "DISTANCE_METRIC": "COSINE"},
+            ),
+        )
+        definition = IndexDefinition(prefix=[self.prefix], index_type=IndexType.HASH)
+        await search.create_index(schema, definition=definition)
+
+    async def add(self, title, vector, synonyms):
+        key = f"{self.prefix}{title}"
+        await self.client.hset(key, mapping={
+            "title": title,
+            "synonyms": json.dumps(synonyms),
+            "embedding": vector.astype(np.float32).tobytes(),
+        })
+        if self.ttl is not None:
+            await self.client.expire(key, self.ttl)
+
+    async def knn(self, vector, k=1):
+        query = (
+            Query(f"*=>[KNN {k} @embedding $vec AS distance]")
+            .sort_by("distance")
+            .return_fields("title", "synonyms", "distance")
+            .paging(0, k)
+            .dialect(2)
+        )
+        result = await self.client.ft(self.name).search(
+            query, query_params={"vec": vector.astype(np.float32).tobytes()}
+        )
+        # COSINE distance is 1 - cosine similarity
+        return [
+            (doc.title, 1.0 - float(doc.distance), json.loads(doc.synonyms))
+            for doc in result.docs
+        ]
+
+
+# -----cache------
+class SemanticCache:
+    '''
+    Reuses synonyms of the most similar stored title when its cosine
+    similarity is at least threshold.
+    '''
+
+    def __init__(self, embedder, index, threshold):
+        self.embedder = embedder
+        self.index = index
+        self.threshold = threshold
+
+    async def lookup(self, title):
+        '''
+        :param title: normalized job title
+        :return: synonyms of a near-duplicate title, or None
+        '''
+        synonyms = await self.nearest(title, self.threshold)
+        metrics.inc("semantic_hits" if synonyms is not None else "semantic_misses")
+        return synonyms
+
+    async def nearest(self, title, threshold):
+        '''
+        :param title: normalized job title
+        :param threshold: minimum cosine similarity
+        :return: synonyms of the closest stored title if at least threshold
+            similar, or None
+        '''
+        try:
+            vector = await self.embedder.embed(title)
+            neighbours = await self.index.knn(vector, k=1)
+        except Exception as e:
+            metrics.inc("semantic_errors")
+            logger.warning("semantic lookup failed for %r: %s", title, e)
+            return None
+        if neighbours and neighbours[0][1] >= threshold:
+            return neighbours[0][2]
+        return None
+
+    async def store(self, title, synonyms):
+        try:
+            vector = await self.embedder.embed(title)
+            await self.index.add(title, vector, synonyms)
+        except Exception as e:
+            metrics.inc("semantic_errors")
+            logger.warning("semantic store failed for %r: %s", title, e)
+
+
+def make_embedder(provider):
+    '''
+    :param provider: "gemini" or "hashing"
+    :return: embedder instance
+    '''
+    if provider == "gemini":
+        return GeminiEmbedder()
+    if provider == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"unknown embedding provider: {provider}")
+
+
+async def create_semantic_cache(client, index_kind, embedder, threshold, ttl=None):
+    '''
+    Builds the semantic cache. "auto" uses RediSearch when the server supports
+    it and falls back to the in-memory index otherwise.
+    :param client: redis.asyncio client
+    :param index_kind: "redis", "memory" or "auto"
+    :param embedder: embedder from make_embedder
+    :param threshold: minimum cosine similarity for a hit
+    :param ttl: lifetime of Redis index entries
+    :return: SemanticCache
+    '''
+    if index_kind in ("redis", "auto"):
+        index = RedisVectorIndex(client, embedder.dim, ttl=ttl)
+        try:
+            await index.ensure()
+            return SemanticCache(embedder, index, threshold)
+        except (RedisError, OSError) as e:
+            if index_kind == "redis":
+                raise
+            logger.warning("RediSearch unavailable (%s); using in-memory vector index", e)
+    return SemanticCache(embedder, InMemoryVectorIndex(embedder.dim), threshold)
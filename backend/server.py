@@ -1,32 +1,264 @@
+from contextlib import asynccontextmanager
 from datetime import timedelta
+from typing import Annotated, Literal
 
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import redis
-from redis.commands.search.field import VectorField, TextField
-# from redis.commands.search.index_definition import IndexDefinition, IndexType
-from redis.exceptions import ResponseError
+from redis.exceptions import RedisError, ResponseError
+import asyncio
 import io
 import os
 import json
 import hashlib
-import uvicorn
-import google.generativeai as genai
-from pydantic import BaseModel
+import logging
+import math
+import time
+import uuid
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
+import metrics
+from canonical import canonical_key, normalize_title
+from roles import ROLE_MATCHER, ROLE_SYNONYMS, SYNONYM_MAP
+from batcher import MicroBatcher
+from freshness import HitCounter, decode_entry, encode_entry
+from l1cache import LRUTTLCache, listen_for_invalidations
+from semantic_cache import RedisVectorIndex, create_semantic_cache, make_embedder
+from suggest import TitleIndex, load_cached, load_static
+from providers import GeminiProvider, ProviderNotReadyError, make_provider
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+from singleflight import SingleFlight, acquire_lease, release_lease
+from redis_health import RedisHealth, is_cluster, make_redis_client, record_pool_metrics
+from query_compiler import PLATFORM_BUDGETS, Not, any_of, pack_queries
+from timing import TimingMiddleware, stage
+from http_cache import CachedResponse, dump_json, etag_matches
+from snapshot import SharedSnapshot
+from title_filter import InvalidTitleError, check_title
+from negative_cache import PREFIX as NEGATIVE_PREFIX, NegativeCache
+from admission import RateLimiter, SynonymsPending, WorkQueue
+
+# longer titles would not fit in a LinkedIn query
+MAX_TITLE_LENGTH = 200
+
 class Form(BaseModel):
-    jobTitle: str
+    jobTitle: str = Field(max_length=MAX_TITLE_LENGTH)
+    platform: Literal["linkedin", "google"] = "linkedin"
     # fullTime: bool = False
     # partTime: bool = False
     # contract: bool = False
     # internship: bool = False
 
+class BatchForm(BaseModel):
+    jobTitles: list[Annotated[str, Field(max_length=MAX_TITLE_LENGTH)]] = Field(max_length=500)
+    platform: Literal["linkedin", "google"] = "linkedin"
+
 load_dotenv()
-genai.configure(api_key=os.getenv("GENAI_API_KEY"))
-CACHE_TTL = timedelta(hours=24)
-redis_client = redis.StrictRedis(host="localhost", port=6379, db=0, decode_responses=True)
-app = FastAPI()
+logger = logging.getLogger(__name__)
+# Entries older than CACHE_TTL are stale: still served, but refreshed in the
+# background. Redis drops them at CACHE_HARD_TTL.
+CACHE_TTL = timedelta(hours=float(os.getenv("CACHE_TTL_HOURS", "24")))
+CACHE_HARD_TTL = timedelta(hours=float(os.getenv("CACHE_HARD_TTL_HOURS", "72")))
+# Refresh-ahead: keys read at least REFRESH_AHEAD_MIN_HITS times within
+# REFRESH_AHEAD_SECONDS are refreshed once they are that close to going stale.
+REFRESH_AHEAD_SECONDS = float(os.getenv("REFRESH_AHEAD_SECONDS", "3600"))
+REFRESH_AHEAD_MIN_HITS = int(os.getenv("REFRESH_AHEAD_MIN_HITS", "5"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Redis connection pool and timeouts. Requests wait up to REDIS_POOL_TIMEOUT
+# for a free connection. Once a command fails, requests skip Redis (serving
+# from the LLM and the per-worker cache) while it is PINGed every
+# REDIS_RETRY_SECONDS; while it is up, every REDIS_HEALTH_CHECK_SECONDS.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.25"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "0.5"))
+REDIS_HEALTH_CHECK_SECONDS = float(os.getenv("REDIS_HEALTH_CHECK_SECONDS", "5"))
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", "1"))
+# Upper bound on Gemini calls in flight per worker, so a burst of misses
+# cannot exhaust the quota or starve the event loop of sockets.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Admission control for misses that need the LLM; cache hits are always
+# served. Each client (X-API-Key, else its address) may send
+# RATE_LIMIT_PER_MINUTE such titles, in bursts of up to RATE_LIMIT_BURST,
+# counted across workers (0 turns the limit off). At most LLM_QUEUE_SIZE
+# titles per worker wait for or are in an LLM call. A shed request gets the
+# queries for the title alone at once, with its synonyms marked pending.
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", str(LLM_MAX_CONCURRENCY * 4)))
+# Retry-After for requests shed because the queue is full
+QUEUE_RETRY_SECONDS = 1
+# LLM resilience: every call gets a deadline; single-title calls are hedged
+# with a second attempt once they run past this latency percentile (0 turns
+# hedging off). The breaker opens at this error rate, or when most calls are
+# slower than LLM_BREAKER_SLOW_SECONDS, and stays open LLM_BREAKER_OPEN_SECONDS.
+# While it is open, misses are answered from the static maps or the closest
+# cached title (SEMANTIC_FALLBACK_THRESHOLD) without waiting on Gemini.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "10"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "8"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+SEMANTIC_FALLBACK_THRESHOLD = float(os.getenv("SEMANTIC_FALLBACK_THRESHOLD", "0.75"))
+# Cross-worker regeneration lease: the holder calls the LLM, the other
+# workers poll the cache for up to LEASE_WAIT_SECONDS, or until the holder
+# releases the lease without writing, before generating it themselves.
+LEASE_TTL_MS = int(os.getenv("LEASE_TTL_MS", "10000"))
+LEASE_WAIT_SECONDS = float(os.getenv("LEASE_WAIT_SECONDS", "5"))
+LEASE_POLL_SECONDS = 0.05
+# In-process (L1) cache in front of Redis (L2). Entries past their TTL are
+# still served for L1_STALE_SECONDS if Redis cannot be reached.
+L1_MAX_SIZE = int(os.getenv("L1_MAX_SIZE", "1024"))
+L1_TTL_SECONDS = float(os.getenv("L1_TTL_SECONDS", "60"))
+L1_STALE_SECONDS = float(os.getenv("L1_STALE_SECONDS", "300"))
+INVALIDATION_CHANNEL = "synonyms:invalidate"
+WORKER_ID = uuid.uuid4().hex
+# Semantic cache: on an exact miss, reuse the synonyms of the closest stored
+# title if its cosine similarity is at least SEMANTIC_THRESHOLD.
+# SEMANTIC_INDEX is "auto" (RediSearch if available, else in-memory),
+# "redis", "memory" or "off".
+SEMANTIC_INDEX = os.getenv("SEMANTIC_INDEX", "auto")
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini")
+SEMANTIC_THRESHOLD = float(os.getenv("SEMANTIC_THRESHOLD", "0.9"))
+# Titles per multi-title LLM prompt on the batch path.
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "25"))
+# Single-title misses arriving within LLM_BATCH_WINDOW_MS of each other share
+# one multi-title prompt (up to LLM_BATCH_SIZE titles). 0 disables batching.
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", "20"))
+# Synonym source: "gemini", or "local" for a flan-t5 model on the CPU
+# (LOCAL_MODEL_RUNTIME "torch", "int8" or "onnx"), which needs no API key.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LOCAL_MODEL = os.getenv("LOCAL_MODEL", "google/flan-t5-base")
+LOCAL_MODEL_RUNTIME = os.getenv("LOCAL_MODEL_RUNTIME", "torch")
+LOCAL_MODEL_BATCH_SIZE = int(os.getenv("LOCAL_MODEL_BATCH_SIZE", "16"))
+LOCAL_MODEL_THREADS = int(os.getenv("LOCAL_MODEL_THREADS", "0")) or None
+# Gemini answers JSON matching a response schema and may generate at most
+# LLM_OUTPUT_TOKENS_PER_TITLE tokens per title in the prompt. Thinking models
+# count their thoughts against that cap, hence a non-thinking default model.
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+LLM_OUTPUT_TOKENS_PER_TITLE = int(os.getenv("LLM_OUTPUT_TOKENS_PER_TITLE", "48"))
+READINESS_TIMEOUT_SECONDS = 1.0
+# Whole /data responses kept per worker, by title and platform. Browsers and
+# proxies may reuse one for RESPONSE_MAX_AGE_SECONDS (default: CACHE_TTL).
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_MAX_AGE_SECONDS = float(os.getenv("RESPONSE_MAX_AGE_SECONDS", str(CACHE_TTL.total_seconds())))
+# Memory-mapped synonym snapshot shared by the workers on a host (off unless
+# SNAPSHOT_PATH is set). One worker rebuilds it from Redis every
+# SNAPSHOT_REFRESH_SECONDS; every worker re-maps the new file.
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv("SNAPSHOT_REFRESH_SECONDS", "300"))
+# Titles the LLM has no usable synonyms for are remembered for
+# NEGATIVE_CACHE_TTL_SECONDS and answered with no synonyms, without Redis or
+# the LLM, from a per-worker Bloom filter sized for NEGATIVE_BLOOM_CAPACITY
+# titles at NEGATIVE_BLOOM_ERROR_RATE false positives. A fraction
+# (NEGATIVE_BLOOM_VERIFY_RATE) of those answers is checked against Redis.
+NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", "3600"))
+NEGATIVE_BLOOM_CAPACITY = int(os.getenv("NEGATIVE_BLOOM_CAPACITY", "100000"))
+NEGATIVE_BLOOM_ERROR_RATE = float(os.getenv("NEGATIVE_BLOOM_ERROR_RATE", "0.001"))
+NEGATIVE_BLOOM_VERIFY_RATE = float(os.getenv("NEGATIVE_BLOOM_VERIFY_RATE", "0.01"))
+# Most suggestions GET /suggest returns.
+SUGGEST_MAX_RESULTS = 10
+
+# One pool per worker, shared by every request.
+redis_client = make_redis_client(
+    REDIS_URL, REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT, REDIS_CONNECT_TIMEOUT,
+    REDIS_POOL_TIMEOUT, REDIS_HEALTH_CHECK_SECONDS,
+)
+redis_health = RedisHealth(lambda: redis_client, REDIS_HEALTH_CHECK_SECONDS, REDIS_RETRY_SECONDS,
+                           READINESS_TIMEOUT_SECONDS, on_recover=lambda: load_from_redis())
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+llm_queue = WorkQueue(LLM_QUEUE_SIZE)
+rate_limiter = RateLimiter(RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_BURST) if RATE_LIMIT_PER_MINUTE > 0 else None
+llm_caller = ResilientCaller(
+    "llm",
+    CircuitBreaker("llm", error_rate=LLM_BREAKER_ERROR_RATE, slow_call_seconds=LLM_BREAKER_SLOW_SECONDS,
+                   open_seconds=LLM_BREAKER_OPEN_SECONDS),
+    timeout=LLM_TIMEOUT_SECONDS,
+    hedge_percentile=LLM_HEDGE_PERCENTILE,
+    # a hedge is one more call in flight, so it needs a slot of its own
+    hedge_slots=llm_semaphore,
+)
+synonym_flight = SingleFlight("llm_calls")
+refresh_flight = SingleFlight("cache_refreshes")
+l1_cache = LRUTTLCache(L1_MAX_SIZE, L1_TTL_SECONDS, L1_STALE_SECONDS)
+response_cache = LRUTTLCache(RESPONSE_CACHE_SIZE, L1_TTL_SECONDS)
+semantic_cache = None
+hit_counter = HitCounter(REFRESH_AHEAD_SECONDS)
+# known titles for /suggest: the static maps now, the cached titles once
+# lifespan has scanned Redis, and every title cached after that
+title_index = TitleIndex(top_k=SUGGEST_MAX_RESULTS)
+load_static(title_index, ROLE_SYNONYMS, SYNONYM_MAP)
+synonym_snapshot = SharedSnapshot(SNAPSHOT_PATH) if SNAPSHOT_PATH else None
+negative_cache = NegativeCache(NEGATIVE_CACHE_TTL_SECONDS, NEGATIVE_BLOOM_CAPACITY, NEGATIVE_BLOOM_ERROR_RATE,
+                               NEGATIVE_BLOOM_VERIFY_RATE)
+negative_checks = SingleFlight("negative_checks")
+# set by lifespan; see /readyz
+started = False
+provider_loading = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global semantic_cache, started, provider_loading
+    if SEMANTIC_INDEX != "off":
+        semantic_cache = await create_semantic_cache(
+            redis_client, SEMANTIC_INDEX, make_embedder(EMBEDDING_PROVIDER),
+            SEMANTIC_THRESHOLD, ttl=CACHE_HARD_TTL,
+        )
+    # the SDK import / model load runs in the background: requests are served
+    # meanwhile, and misses fall back until the provider is ready
+    provider_loading = asyncio.create_task(load_provider())
+    loading = asyncio.create_task(load_from_redis(check=True))
+    health_checks = asyncio.create_task(redis_health.run())
+    background = [provider_loading, loading, health_checks]
+    if synonym_snapshot is not None:
+        # serve from the last snapshot right away; the task keeps it current
+        synonym_snapshot.reload()
+        background.append(asyncio.create_task(synonym_snapshot.run(redis_client, SNAPSHOT_REFRESH_SECONDS)))
+    # Redis Cluster has no pub/sub here; L1_TTL_SECONDS bounds staleness
+    if not is_cluster(redis_client):
+        background.append(asyncio.create_task(
+            listen_for_invalidations(redis_client, l1_cache, INVALIDATION_CHANNEL, WORKER_ID,
+                                     on_key=cache_rewritten)
+        ))
+    started = True
+    yield
+    started = False
+    for task in background:
+        task.cancel()
+    if synonym_snapshot is not None and synonym_snapshot.current is not None:
+        synonym_snapshot.current.close()
+    await synonym_provider.close()
+    await redis_client.aclose()
+    pool = getattr(redis_client, "connection_pool", None)
+    if pool is not None:
+        await pool.disconnect()
+
+
+async def load_from_redis(check=False):
+    '''
+    Loads the cached titles into the suggest index and the negative titles
+    into the Bloom filter. Run at startup and again each time Redis comes
+    back, in case it was down at startup (or entries were written meanwhile).
+    :param check: PING first and skip the loads if Redis is down; they run
+        once it is back
+    '''
+    if check and not await redis_health.check():
+        return
+    await asyncio.gather(load_cached(title_index, redis_client), negative_cache.load(redis_client))
+
+def usable_semantic_cache():
+    '''
+    :return: semantic_cache, or None while its index is in Redis and Redis
+        is down, so a degraded miss doesn't wait on Redis timeouts for it
+    '''
+    if isinstance(getattr(semantic_cache, "index", None), RedisVectorIndex) and not redis_health.available:
+        metrics.inc("semantic_bypassed")
+        return None
+    return semantic_cache
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,7 +266,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
+app.add_middleware(TimingMiddleware)
 
 # We keep these lists short (<= 4 items) to obey the <= 5 OR clause limit.
 ACTION_PHRASES = [
@@ -49,119 +283,704 @@ EXCLUSION_PHRASES = [
     "contract"
 ]
 
-ROLE_SYNONYMS = {
-  "software developer": [
-    "software engineer",
-    "backend engineer",
-    "full stack developer",
-    "application developer",
-  ],
-  "data scientist": [
-    "machine learning engineer",
-    "ai engineer",
-    "data analyst",
-    "research scientist",
-  ],
-  "systems engineer": [
-    "devops engineer",
-    "site reliability engineer",
-    "infrastructure engineer",
-  ]
-}
+# compiled once; every query ends in one of these, see build_boolean_queries
+ACTIONS_CLAUSE = any_of(ACTION_PHRASES)
+EXCLUSIONS_CLAUSE = Not(any_of(EXCLUSION_PHRASES))
+QUERY_CLAUSES = ((ACTIONS_CLAUSE, EXCLUSIONS_CLAUSE), (ACTIONS_CLAUSE,), ())
 
 # -----utilities------
 #utility functions for redis access
-def get_synonyms(jobTitle):
+async def get_synonyms(jobTitle, client_id=None):
     '''
     returns the synonyms for the given jobTitle
     :param jobTitle: job title
+    :param client_id: rate-limit identity of the caller (see client_identity),
+        or None to skip the per-client limit
     :return: list of synonyms
+    :raises SynonymsPending: a miss was shed by admission control
     '''
-    global redis_client
     synonyms = []
-    jobTitle = jobTitle.strip().lower()
-#     first check in the redis server
-    cached_synonyms = redis_client.get(jobTitle)
+    with stage("normalize"):
+        # the LLM is asked about the title as typed; the cache is keyed by role
+        prompt = normalize_title(jobTitle)
+        jobTitle = canonical_key(jobTitle)
+#     first check the in-process cache, then the redis server
+    with stage("cache_l1"):
+        synonyms = l1_cache.get(jobTitle)
+    if synonyms is not None:
+        metrics.inc("cache_l1_hits")
+        return synonyms
+    metrics.inc("cache_l1_misses")
+
+    if is_negative(jobTitle):
+        return NoSynonyms()
+
+    if synonym_snapshot is not None:
+        with stage("snapshot"):
+            found = synonym_snapshot.get(jobTitle)
+        if found is not None:
+            metrics.inc("cache_snapshot_hits")
+            synonyms, soft_expiry = found
+            maybe_refresh(jobTitle, soft_expiry)
+            l1_cache.set(jobTitle, synonyms)
+            return synonyms
+        metrics.inc("cache_snapshot_misses")
+
+    cached_synonyms = None
+    if redis_health.available:
+        try:
+            with stage("redis_get"):
+                cached_synonyms = await redis_client.get(jobTitle)
+        except RedisError as e:
+            metrics.inc("cache_errors")
+            redis_health.mark_down(e)
+    if not redis_health.available:
+        # degraded: no waiting on Redis; the per-worker cache or the LLM answers
+        synonyms = l1_cache.get_stale(jobTitle)
+        if synonyms is not None:
+            metrics.inc("cache_l1_stale_served")
+            return synonyms
+        metrics.inc("cache_bypassed")
+        with stage("regenerate"):
+            synonyms = await regenerate_admitted(jobTitle, client_id, prompt)
+        l1_cache.set(jobTitle, synonyms)
+        return synonyms
+
     if cached_synonyms:
-        synonyms = cached_synonyms
-        return json.loads(synonyms)
+        metrics.inc("cache_l2_hits")
+        synonyms, soft_expiry = decode_entry(cached_synonyms)
+        title_index.add_cached(jobTitle, synonyms)
+        maybe_refresh(jobTitle, soft_expiry)
     else:
-        synonyms = llm_call(jobTitle)
-        redis_client.setex(jobTitle, CACHE_TTL, json.dumps(synonyms))
+        metrics.inc("cache_l2_misses")
+        with stage("regenerate"):
+            synonyms = await regenerate_admitted(jobTitle, client_id, prompt)
+    l1_cache.set(jobTitle, synonyms)
     return synonyms
 
-def llm_call(title):
+async def regenerate_admitted(jobTitle, client_id, prompt=None):
+    '''
+    regenerate_synonyms for a miss, going through admission control only once
+    it turns out to need the LLM (not for a semantic cache hit, nor for a key
+    another worker wrote meanwhile). Concurrent misses for the same title
+    share one call, and its outcome.
+    :raises SynonymsPending: the LLM call was shed
+    '''
+    return await synonym_flight.do(
+        jobTitle, lambda: regenerate_synonyms(jobTitle, prompt=prompt, admission=lambda: admit(client_id, 1))
+    )
+
+async def admit(client_id, count):
+    '''
+    Admission control for titles that need an LLM call: as many as the LLM
+    queue has room for and the client has rate-limit tokens for
+    :param client_id: see client_identity, or None for no per-client limit
+    :param count: titles needing the LLM
+    :return: (number admitted, the first ones, and seconds after which the
+        rest may be retried); the caller must llm_queue.leave(admitted)
+        once done
+    :raises SynonymsPending: none were admitted
+    '''
+    with stage("admission"):
+        room = min(count, llm_queue.room())
+        if room < count:
+            metrics.inc("requests_shed", count - room, labels={"reason": "queue_full"})
+        admitted, retry_after = room, QUEUE_RETRY_SECONDS
+        if room and rate_limiter is not None and client_id is not None:
+            admitted, retry_after = await acquire_tokens(client_id, room)
+            if admitted < room:
+                metrics.inc("requests_shed", room - admitted, labels={"reason": "rate_limited"})
+    if not admitted:
+        raise SynonymsPending("rate_limited" if room else "queue_full", retry_after)
+    metrics.inc("llm_admitted", admitted)
+    llm_queue.enter(admitted)
+    return admitted, retry_after
+
+async def acquire_tokens(client_id, count):
+    '''
+    :return: (tokens granted from client_id's bucket, seconds until the next one)
+    '''
+    if redis_health.available:
+        try:
+            return await rate_limiter.acquire(redis_client, client_id, count)
+        except RedisError as e:
+            metrics.inc("cache_errors")
+            redis_health.mark_down(e)
+    # per-worker buckets until Redis is back
+    return rate_limiter.acquire_local(client_id, count)
+
+def is_negative(jobTitle):
+    '''
+    :param jobTitle: canonical job title
+    :return: True if the LLM recently had no synonyms for it (or, rarely, a
+        Bloom filter false positive)
+    '''
+    with stage("negative_cache"):
+        negative = jobTitle in negative_cache
+    if negative:
+        metrics.inc("negative_cache_hits")
+        if redis_health.available and negative_cache.should_verify():
+            negative_checks.start(jobTitle, lambda: negative_cache.verify(redis_client, jobTitle))
+    return negative
+
+async def remember_negative(jobTitle):
+    '''
+    Records that the LLM had no usable synonyms for jobTitle, here and, through
+    Redis, on the other workers
+    :param jobTitle: canonical job title
+    '''
+    if not redis_health.available:
+        negative_cache.add(jobTitle)
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        negative_cache.store(pipe, jobTitle)
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps({"key": NEGATIVE_PREFIX + jobTitle, "origin": WORKER_ID}))
+        try:
+            await pipe.execute()
+        except RedisError as e:
+            metrics.inc("cache_errors")
+            redis_health.mark_down(e)
+
+def maybe_refresh(jobTitle, soft_expiry):
+    '''
+    Schedules a background refresh of a cache entry that is stale, or hot and
+    about to go stale. The caller keeps the current value and never waits.
+    :param jobTitle: canonical job title
+    :param soft_expiry: unix time at which the entry goes stale
+    '''
+    remaining = soft_expiry - time.time()
+    hits = hit_counter.hit(jobTitle)
+    if remaining <= 0:
+        metrics.inc("cache_stale_served")
+    elif remaining > REFRESH_AHEAD_SECONDS or hits < REFRESH_AHEAD_MIN_HITS:
+        return
+    if refresh_flight.is_in_flight(jobTitle):
+        return
+    metrics.inc("cache_refreshes")
+    refresh_flight.start(jobTitle, lambda: refresh_synonyms(jobTitle))
+
+async def refresh_synonyms(jobTitle):
+    try:
+        synonyms = await regenerate_synonyms(jobTitle, refresh=True)
+    except Exception:
+        metrics.inc("cache_refresh_errors")
+        logger.exception("background refresh failed for %r", jobTitle)
+        return
+    if synonyms is not None:
+        l1_cache.set(jobTitle, synonyms)
+
+async def regenerate_synonyms(jobTitle, refresh=False, prompt=None, admission=None):
+    '''
+    Fills the cache for jobTitle. Only the worker holding the Redis lease calls
+    the LLM; the others wait for it to write the key.
+    :param jobTitle: canonical job title
+    :param refresh: True when replacing an existing entry; skips the semantic
+        cache, which would just return the entry being replaced
+    :param prompt: normalized title to ask the LLM about; jobTitle if None
+    :param admission: coroutine function run just before calling the LLM,
+        returning admit's result; None to call it unconditionally
+    :return: list of synonyms, or None if refresh is set and another worker
+        is already refreshing the key
+    :raises SynonymsPending: admission shed the LLM call
+    '''
+    lease_key = f"lease:{jobTitle}"
+    token = None
+    try:
+        if redis_health.available:
+            token = await acquire_lease(redis_client, lease_key, LEASE_TTL_MS)
+            if token is None:
+                if refresh:
+                    # another worker is already refreshing this key
+                    return None
+                deadline = asyncio.get_running_loop().time() + LEASE_WAIT_SECONDS
+                while asyncio.get_running_loop().time() < deadline:
+                    await asyncio.sleep(LEASE_POLL_SECONDS)
+                    # the holder writes before it releases, so check the lease first
+                    async with redis_client.pipeline(transaction=False) as pipe:
+                        pipe.exists(lease_key)
+                        pipe.get(jobTitle)
+                        pipe.exists(NEGATIVE_PREFIX + jobTitle)
+                        leased, cached_synonyms, negative = await pipe.execute()
+                    if cached_synonyms:
+                        metrics.inc("llm_calls_coalesced_remote")
+                        return decode_entry(cached_synonyms)[0]
+                    if negative or jobTitle in negative_cache:
+                        # the lease holder's LLM had no synonyms for it
+                        negative_cache.add(jobTitle)
+                        return NoSynonyms()
+                    if not leased:
+                        # released without a write (its LLM call failed): take
+                        # over, or generate without the lease if another
+                        # worker just did
+                        metrics.inc("lease_released_early")
+                        token = await acquire_lease(redis_client, lease_key, LEASE_TTL_MS)
+                        break
+                # the lease holder is slow or died; generate it ourselves
+    except RedisError as e:
+        # carry on without the lease or the cache write
+        metrics.inc("cache_errors")
+        redis_health.mark_down(e)
+    try:
+        synonyms = None
+        semantic = usable_semantic_cache()
+        if semantic is not None and not refresh:
+            with stage("semantic_lookup"):
+                synonyms = await semantic.lookup(jobTitle)
+        if synonyms is None:
+            admitted = (await admission())[0] if admission is not None else 0
+            try:
+                with stage("llm"):
+                    if llm_batcher is not None:
+                        synonyms = await llm_batcher.submit(prompt or jobTitle)
+                    else:
+                        synonyms = await llm_call(prompt or jobTitle)
+            except Exception as e:
+                if refresh:
+                    # keep serving the current entry
+                    raise
+                logger.warning("LLM unavailable for %r, using fallback: %s", jobTitle, e)
+                # not cached in Redis, so the next miss tries the LLM again
+                return FallbackSynonyms(await fallback_synonyms(jobTitle) or [])
+            finally:
+                llm_queue.leave(admitted)
+            if not synonyms:
+                # junk; remembered briefly instead of cached for CACHE_TTL
+                await remember_negative(jobTitle)
+                return None if refresh else NoSynonyms()
+            if semantic is not None:
+                await semantic.store(jobTitle, synonyms)
+        if redis_health.available:
+            try:
+                with stage("redis_setex"):
+                    await redis_client.setex(jobTitle, CACHE_HARD_TTL, encode_entry(synonyms, CACHE_TTL, CACHE_HARD_TTL))
+                    await redis_client.publish(
+                        INVALIDATION_CHANNEL, json.dumps({"key": jobTitle, "origin": WORKER_ID})
+                    )
+                cache_rewritten(jobTitle, synonyms)
+            except RedisError as e:
+                metrics.inc("cache_errors")
+                redis_health.mark_down(e)
+    finally:
+        if token is not None and redis_health.available:
+            try:
+                await release_lease(redis_client, lease_key, token)
+            except RedisError as e:
+                # the lease expires on its own after LEASE_TTL_MS
+                redis_health.mark_down(e)
+    return synonyms
+
+def cache_rewritten(jobTitle, synonyms=()):
+    '''
+    Called after jobTitle is written to Redis, by this worker or (through
+    the invalidation channel) another one
+    :param jobTitle: canonical job title
+    :param synonyms: its new synonyms, if known
+    '''
+    if jobTitle.startswith(NEGATIVE_PREFIX):
+        # another worker's LLM had no synonyms for this title
+        negative_cache.add(jobTitle[len(NEGATIVE_PREFIX):])
+        return
+    title_index.add_cached(jobTitle, synonyms)
+    if synonym_snapshot is not None:
+        # the snapshot's entry is older; read Redis until the next rebuild
+        synonym_snapshot.invalidate(jobTitle)
+
+class NoSynonyms(list):
+    '''
+    The answer for a title the LLM has no usable synonyms for: always empty,
+    never written to the synonym cache, and responses built from it are not
+    cacheable
+    '''
+
+class FallbackSynonyms(list):
+    '''
+    Synonyms standing in for the LLM's while it is unavailable. They are not
+    written to Redis, and responses built from them are not cacheable.
+    '''
+
+async def fallback_synonyms(jobTitle):
+    '''
+    Synonyms to serve when the LLM fails or its circuit is open: the most
+    specific static role in the title first, then the closest title in the
+    semantic cache
+    :param jobTitle: canonical job title
+    :return: list of synonyms, or None if there is no fallback
+    '''
+    synonyms = ROLE_MATCHER.lookup(jobTitle)
+    source = "static"
+    semantic = usable_semantic_cache() if synonyms is None else None
+    if semantic is not None:
+        synonyms = await semantic.nearest(jobTitle, SEMANTIC_FALLBACK_THRESHOLD)
+        source = "neighbor"
+    metrics.inc("llm_fallbacks", labels={"source": source if synonyms is not None else "none"})
+    return list(synonyms) if synonyms is not None else None
+
+async def get_synonyms_batch(jobTitles, client_id=None, prompts=None):
+    '''
+    returns the synonyms for many canonical, unique job titles at once: one
+    MGET for the cache, the semantic cache for the misses, one LLM prompt per
+    LLM_BATCH_SIZE of the rest and one pipelined write-back. Misses already
+    being generated by a /data request on this worker wait for that call.
+    :param jobTitles: list of canonical job titles
+    :param client_id: rate-limit identity of the caller, see get_synonyms
+    :param prompts: dict title -> normalized title to ask the LLM about, for
+        the titles not to be asked about by their canonical form
+    :return: (dict title -> synonyms, dict title -> error message, dict
+        title -> Retry-After seconds for the misses admission control shed)
     '''
-    Calls the LLM for returning alternate names of the given job titles
+    found = {}
+    errors = {}
+    pending = []
+    for jobTitle in jobTitles:
+        synonyms = l1_cache.get(jobTitle)
+        if synonyms is not None:
+            metrics.inc("cache_l1_hits")
+            found[jobTitle] = synonyms
+            continue
+        metrics.inc("cache_l1_misses")
+        if is_negative(jobTitle):
+            found[jobTitle] = NoSynonyms()
+            continue
+        snapshot_entry = synonym_snapshot.get(jobTitle) if synonym_snapshot is not None else None
+        if snapshot_entry is not None:
+            metrics.inc("cache_snapshot_hits")
+            found[jobTitle], soft_expiry = snapshot_entry
+            l1_cache.set(jobTitle, found[jobTitle])
+            maybe_refresh(jobTitle, soft_expiry)
+            continue
+        if synonym_snapshot is not None:
+            metrics.inc("cache_snapshot_misses")
+        pending.append(jobTitle)
+    if not pending:
+        return found, errors, {}
+
+    cached = None
+    if redis_health.available:
+        try:
+            with stage("redis_mget"):
+                # Cluster clients split the keys by slot
+                mget = getattr(redis_client, "mget_nonatomic", redis_client.mget)
+                cached = await mget(pending)
+        except RedisError as e:
+            metrics.inc("cache_errors")
+            redis_health.mark_down(e)
+    if cached is None:
+        # degraded: stale per-worker entries where we have them, the LLM for the rest
+        metrics.inc("cache_bypassed", len(pending))
+        for jobTitle in pending:
+            synonyms = l1_cache.get_stale(jobTitle)
+            if synonyms is not None:
+                metrics.inc("cache_l1_stale_served")
+                found[jobTitle] = synonyms
+        pending = [jobTitle for jobTitle in pending if jobTitle not in found]
+        cached = [None] * len(pending)
+
+    misses = []
+    for jobTitle, cached_synonyms in zip(pending, cached):
+        if cached_synonyms:
+            metrics.inc("cache_l2_hits")
+            found[jobTitle], soft_expiry = decode_entry(cached_synonyms)
+            l1_cache.set(jobTitle, found[jobTitle])
+            title_index.add_cached(jobTitle, found[jobTitle])
+            maybe_refresh(jobTitle, soft_expiry)
+        else:
+            if redis_health.available:
+                metrics.inc("cache_l2_misses")
+            misses.append(jobTitle)
+    if not misses:
+        return found, errors, {}
+
+    # titles a /data request on this worker is already generating share its call
+    in_flight = [jobTitle for jobTitle in misses if synonym_flight.is_in_flight(jobTitle)]
+    if in_flight:
+        outcomes = await asyncio.gather(
+            *(synonym_flight.do(jobTitle, lambda jobTitle=jobTitle: regenerate_synonyms(jobTitle))
+              for jobTitle in in_flight),
+            return_exceptions=True,
+        )
+        for jobTitle, outcome in zip(in_flight, outcomes):
+            if not isinstance(outcome, Exception):
+                found[jobTitle] = outcome
+        misses = [jobTitle for jobTitle in misses if jobTitle not in found]
+
+    # near-duplicates of cached titles need no LLM call, nor admission
+    generated = {}
+    semantic = usable_semantic_cache() if misses else None
+    if semantic is not None:
+        with stage("semantic_lookup"):
+            similar = await asyncio.gather(*(semantic.lookup(jobTitle) for jobTitle in misses))
+        generated = {jobTitle: synonyms for jobTitle, synonyms in zip(misses, similar) if synonyms is not None}
+        misses = [jobTitle for jobTitle in misses if jobTitle not in generated]
+
+    shed = {}
+    admitted = 0
+    if misses:
+        try:
+            admitted, retry_after = await admit(client_id, len(misses))
+        except SynonymsPending as e:
+            retry_after = e.retry_after
+        shed = dict.fromkeys(misses[admitted:], retry_after)
+        misses = misses[:admitted]
+    chunks = [misses[i:i + LLM_BATCH_SIZE] for i in range(0, len(misses), LLM_BATCH_SIZE)]
+    outcomes = []
+    if chunks:
+        try:
+            with stage("llm"):
+                outcomes = await asyncio.gather(
+                    *(llm_call_batch_keyed(chunk, prompts or {}) for chunk in chunks), return_exceptions=True
+                )
+        finally:
+            llm_queue.leave(admitted)
+    from_llm = {}
+    for chunk, outcome in zip(chunks, outcomes):
+        for jobTitle in chunk:
+            if isinstance(outcome, Exception):
+                error = f"synonym generation failed: {outcome}"
+            elif jobTitle in outcome:
+                synonyms = outcome[jobTitle]
+                if synonyms:
+                    from_llm[jobTitle] = synonyms
+                else:
+                    await remember_negative(jobTitle)
+                    found[jobTitle] = NoSynonyms()
+                continue
+            else:
+                error = "LLM returned no synonyms for this title"
+            synonyms = await fallback_synonyms(jobTitle)
+            if synonyms is None:
+                errors[jobTitle] = error
+            else:
+                found[jobTitle] = synonyms
+
+    semantic = usable_semantic_cache() if from_llm else None
+    if semantic is not None:
+        # so later near-duplicates, on /data or here, reuse them
+        await asyncio.gather(*(semantic.store(jobTitle, synonyms) for jobTitle, synonyms in from_llm.items()))
+    generated.update(from_llm)
+    if generated:
+        written = False
+        if redis_health.available:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for jobTitle, synonyms in generated.items():
+                    pipe.setex(jobTitle, CACHE_HARD_TTL, encode_entry(synonyms, CACHE_TTL, CACHE_HARD_TTL))
+                    pipe.publish(INVALIDATION_CHANNEL, json.dumps({"key": jobTitle, "origin": WORKER_ID}))
+                try:
+                    with stage("redis_setex"):
+                        await pipe.execute()
+                    written = True
+                except RedisError as e:
+                    metrics.inc("cache_errors")
+                    redis_health.mark_down(e)
+        for jobTitle, synonyms in generated.items():
+            l1_cache.set(jobTitle, synonyms)
+            if written:
+                cache_rewritten(jobTitle, synonyms)
+        found.update(generated)
+    return found, errors, shed
+
+async def llm_call(title):
+    '''
+    Asks the synonym provider for alternate names of the given job title.
+    At most LLM_MAX_CONCURRENCY calls run at once; the rest wait without
+    blocking the event loop, so cache hits are served in the meantime.
     :param title: title of the job
-    :return: list of alternate names
+    :return: list of usable alternate names, possibly empty
     '''
-    prompt = f"""
-    Strictly list only 4 alternative professional job titles or synonyms that mean the same as '{title}'.
-    Focus on realistic variations used in job postings.
-    Output them as a comma-separated list.
-    """
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    response = model.generate_content(prompt)
-    text = response.text.strip()
+    return await provider_call(lambda: synonym_provider.synonyms(title), "single")
 
-    results = [s.strip() for s in text.split(",") if s.strip()]
-    return results
+async def llm_call_batch(titles):
+    '''
+    Asks the synonym provider once for the alternate names of several job titles
+    :param titles: list of job titles
+    :return: dict title -> list of usable alternate names, for the titles the provider answered
+    '''
+    metrics.inc("llm_batch_calls")
+    return await provider_call(lambda: synonym_provider.synonyms_batch(titles), "batch")
 
-def build_boolean_queries(main_title):
-    """
-    Builds a *list* of short, safe queries that respect LinkedIn limits.
-    """
-    queries = []
+async def llm_call_batch_keyed(jobTitles, prompts):
+    '''
+    llm_call_batch, asking about each canonical title by its prompt
+    :param jobTitles: list of canonical job titles
+    :param prompts: dict title -> normalized title to ask about instead
+    :return: dict canonical title -> list of usable alternate names
+    '''
+    asked = {prompts.get(jobTitle, jobTitle): jobTitle for jobTitle in jobTitles}
+    answers = await llm_call_batch(list(asked))
+    return {asked[title]: synonyms for title, synonyms in answers.items() if title in asked}
 
-    # --- Build reusable, safe query parts ---
+# where synonyms come from, see LLM_PROVIDER; swapped out by use_backends
+synonym_provider = make_provider(
+    LLM_PROVIDER, gemini_model=GEMINI_MODEL, output_tokens_per_title=LLM_OUTPUT_TOKENS_PER_TITLE,
+    model=LOCAL_MODEL, runtime=LOCAL_MODEL_RUNTIME, batch_size=LOCAL_MODEL_BATCH_SIZE, threads=LOCAL_MODEL_THREADS,
+)
 
-    # Main title part (1 term)
-    main_title_part = f'"{main_title.title()}"'
+def use_backends(redis=None, generate=None):
+    '''
+    Replaces the Redis client and/or the LLM call, e.g. with an in-memory
+    Redis and a stub LLM for benchmarks (see benchmarks/fakes.py)
+    :param redis: redis.asyncio-compatible client
+    :param generate: coroutine function taking a prompt and a generation
+        config and returning a Gemini-like response
+    '''
+    global redis_client, synonym_provider
+    if redis is not None:
+        redis_client = redis
+    if generate is not None:
+        synonym_provider = GeminiProvider(generate, GEMINI_MODEL, LLM_OUTPUT_TOKENS_PER_TITLE)
 
-    # All titles part (max 4 terms, 3 ORs)
-    all_titles_list = [main_title.title()]
-    # all_titles_list = [main_title.title()] + synonyms
-    titles_query_part = f"({' OR '.join([f'"{t}"' for t in all_titles_list])})"
+async def load_provider():
+    started_at = time.perf_counter()
+    try:
+        await synonym_provider.start()
+    except Exception:
+        logger.exception("%s provider failed to load", synonym_provider.name)
+        raise
+    metrics.set_gauge("provider_load_seconds", time.perf_counter() - started_at,
+                      {"provider": synonym_provider.name})
 
-    # All actions part (max 4 terms, 3 ORs)
-    actions_query_part = f"({' OR '.join([f'"{p}"' for p in ACTION_PHRASES])})"
+async def provider_call(call, kind):
+    '''
+    Runs one synonym provider call under the LLM_MAX_CONCURRENCY bound,
+    through llm_caller (deadline, hedging, circuit breaker), and records call
+    latency and calls in flight
+    :param call: zero-argument coroutine function making the call
+    :param kind: "single" or "batch", used as a metric label
+    :return: the call's result
+    :raises ProviderNotReadyError: the provider's model is still loading;
+        the caller falls back without the breaker counting a failure
+    '''
+    if not synonym_provider.ready:
+        metrics.inc("llm_not_ready")
+        raise ProviderNotReadyError(f"{synonym_provider.name} provider is still loading")
+    metrics.inc("llm_calls")
+    queued = time.perf_counter()
+    async with llm_semaphore:
+        metrics.observe("llm_queue_wait_seconds", time.perf_counter() - queued)
+        metrics.add_gauge("llm_in_flight", 1)
+        started = time.perf_counter()
+        try:
+            # batch prompts are too expensive to send twice, so only single
+            # calls are hedged, and only by providers where a duplicate
+            # attempt does not just queue behind the first
+            hedge = kind == "single" and synonym_provider.hedge
+            return await llm_caller.call(call, hedge=hedge)
+        except Exception:
+            metrics.inc("llm_errors", labels={"kind": kind})
+            raise
+        finally:
+            metrics.add_gauge("llm_in_flight", -1)
+            metrics.observe("llm_call_seconds", time.perf_counter() - started, {"kind": kind})
 
-    # All exclusions part (max 4 terms, 3 ORs)
-    exclusions_query_part = f"NOT ({' OR '.join([f'"{p}"' for p in EXCLUSION_PHRASES])})"
+# shared by every request on this worker; see LLM_BATCH_WINDOW_MS
+llm_batcher = None
+if LLM_BATCH_WINDOW_MS > 0:
+    # a batch that ran out of time or hit the open breaker is not retried
+    # title by title, so a miss waits at most about one LLM_TIMEOUT_SECONDS
+    llm_batcher = MicroBatcher(llm_call_batch, llm_call, LLM_BATCH_WINDOW_MS / 1000, LLM_BATCH_SIZE,
+                               no_retry=(asyncio.TimeoutError, CircuitOpenError))
 
-    # --- Generate the query list ---
+def build_boolean_queries(main_title, synonyms=(), platform="linkedin"):
+    """
+    Builds the fewest queries that mention the main title and every synonym
+    while staying within the platform's limits (see query_compiler.py).
+    Each query is (titles) AND (actions) AND NOT (exclusions), dropping the
+    exclusions, then the actions, only if a title would not fit otherwise.
+    """
+    titles = [main_title.title()] + [s.title() for s in synonyms]
+    return pack_queries(titles, PLATFORM_BUDGETS[platform], QUERY_CLAUSES)
 
-    # Query 1: Main Title + All Actions (Simple & Effective)
-    # Ops: 1 AND + 3 ORs = 4 (SAFE)
-    queries.append(f"{main_title_part} AND {actions_query_part}")
+def validate_title(jobTitle):
+    '''
+    :param jobTitle: job title from the request
+    :return: its canonical key
+    :raises HTTPException: 422 if it cannot be a job title (see title_filter.py)
+    '''
+    try:
+        with stage("validate"):
+            return check_title(jobTitle)
+    except InvalidTitleError as e:
+        metrics.inc("titles_rejected", labels={"reason": e.reason})
+        raise HTTPException(status_code=422, detail=str(e))
 
-    # Query 2: All Titles + "hiring" (Broadest "hiring" search)
-    # Ops: 3 ORs + 1 AND = 4 (SAFE)
-    queries.append(f'{titles_query_part} AND "hiring"')
+def client_identity(request):
+    '''
+    :return: who a request counts against for rate limiting: a hash of its
+        X-API-Key header, else its address
+    '''
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return "ip:" + (request.client.host if request.client else "unknown")
 
-    # Query 3: All Titles + "recruiting" (Broad "recruiting" search)
-    # Ops: 3 ORs + 1 AND = 4 (SAFE)
-    queries.append(f'{titles_query_part} AND "recruiting"')
+def retry_after_header(pending):
+    return max(1, math.ceil(pending.retry_after))
 
-    # Query 4: Main Title + All Actions + All Exclusions (Most Complex)
-    # Ops: 1 AND + 3 ORs + 1 AND + 1 NOT + 3 ORs = 9 (SAFE)
-    # This is the longest query we'll make, should be < 250 chars.
-    queries.append(f"{main_title_part} AND {actions_query_part} AND {exclusions_query_part}")
+async def data_response(request, jobTitle, platform):
+    '''
+    Builds the /data response, or reuses the one built for the same title
+    while its synonyms are unchanged. A GET whose If-None-Match matches gets
+    a 304, a POST a 412 (RFC 9110). Reuse and conditional requests touch
+    neither Redis nor the LLM only while this worker's L1 entry for the
+    title is alive (L1_TTL_SECONDS); after that the synonyms are read again
+    before the ETag is compared. Titles that cannot be job titles get a 422.
+    '''
+    validate_title(jobTitle)
+    title = normalize_title(jobTitle)
+    response_key = (title, platform)
+    entry = response_cache.get(response_key)
+    # valid only while the synonym cache holds the list it was built from
+    if entry is not None and l1_cache.get(canonical_key(jobTitle)) is not entry.synonyms:
+        response_cache.delete(response_key)
+        entry = None
+    if entry is not None:
+        metrics.inc("response_cache_hits")
+        # it was checked against the L1 entry, so count it as the L1 hit
+        # get_synonyms would have counted
+        metrics.inc("cache_l1_hits")
+    else:
+        metrics.inc("response_cache_misses")
+        #send synonyms to the user to try other searches
+        try:
+            alternate_job_titles = await get_synonyms(jobTitle, client_identity(request))
+        except SynonymsPending as e:
+            # shed: the queries for the title alone now, synonyms on a retry
+            body = dump_json({
+                "message": "Form received successfully!",
+                "data": build_boolean_queries(title, platform=platform),
+                "additional_job_titles": [],
+                "synonyms_pending": True,
+            })
+            return Response(body, media_type="application/json",
+                            headers={"Cache-Control": "no-store", "Retry-After": str(retry_after_header(e))})
 
-    # Query 5: All Titles + All Actions (Riskier, but good to try)
-    # Ops: 3 ORs + 1 AND + 3 ORs = 7 (SAFE)
-    # This might get long, but operators are fine.
-    # queries.append(f"{titles_query_part} AND {actions_query_part}")
+        # You can add logic later to modify queries based on the flags above.
+        with stage("build_queries"):
+            queries = build_boolean_queries(title, alternate_job_titles, platform)
 
-    # Query 6: Just All Titles (For manual scanning)
-    # Ops: 3 ORs (SAFE)
-    # queries.append(f"{titles_query_part}")
+        with stage("serialize"):
+            body = dump_json({
+                "message": "Form received successfully!",
+                "data": queries,
+                "additional_job_titles": alternate_job_titles
+            })
+        if isinstance(alternate_job_titles, (FallbackSynonyms, NoSynonyms)) or not redis_health.available:
+            # a stand-in answer; the next request should try again
+            entry = CachedResponse(body, alternate_job_titles, max_age=0)
+        else:
+            entry = CachedResponse(body, alternate_job_titles, RESPONSE_MAX_AGE_SECONDS,
+                                   (CACHE_HARD_TTL - CACHE_TTL).total_seconds())
+            response_cache.set(response_key, entry)
 
-    return queries
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        if request.method not in ("GET", "HEAD"):
+            metrics.inc("responses_precondition_failed")
+            return Response(status_code=412, headers={"ETag": entry.etag})
+        metrics.inc("responses_not_modified")
+        return Response(status_code=304, headers=entry.headers)
+    return Response(entry.body, media_type="application/json", headers=entry.headers)
 
 @app.post("/data")
-async def generate_smart_queries(form: Form):
+async def generate_smart_queries(form: Form, request: Request):
     jobTitle = form.jobTitle
     # fullTime = form.fullTime
     # partTime = form.partTime
@@ -171,20 +990,186 @@ async def generate_smart_queries(form: Form):
     # Just a debug log
     # print(f"Received: {form.dict()}")
 
-    # You can add logic later to modify queries based on the flags above.
-    queries = build_boolean_queries(jobTitle.lower())
-
-    #send synonyms to the user to try other searches
-    alternate_job_titles = get_synonyms(jobTitle.lower())
-
     # alternate_job_titles =  ROLE_SYNONYMS[jobTitle.lower()] if jobTitle.lower() in ROLE_SYNONYMS else llm_call(jobTitle.lower())
     # if jobTitle.lower() not in ROLE_SYNONYMS:
     #     ROLE_SYNONYMS[jobTitle.lower()] = alternate_job_titles
 
+    return await data_response(request, jobTitle, form.platform)
+
+@app.get("/data")
+async def get_smart_queries(
+    request: Request,
+    jobTitle: str = Query(max_length=MAX_TITLE_LENGTH),
+    platform: Literal["linkedin", "google"] = "linkedin",
+):
+    # same as POST /data, but cacheable by browsers, CDNs and reverse proxies
+    return await data_response(request, jobTitle, platform)
+
+@app.post("/data/stream")
+async def generate_smart_queries_stream(form: Form, request: Request, expand: bool = True):
+    '''
+    Same result as /data, streamed as newline-delimited JSON so the client can
+    show the queries before the LLM has answered:
+        {"event": "queries", "data": [...]}            queries for the title alone
+        {"event": "additional_job_titles", "data": [...]}
+        {"event": "expanded_queries", "data": [...]}   queries including synonyms, if expand
+        {"event": "done"}
+    A failure after the first line is reported as {"event": "error", "message": ...};
+    a request shed by admission control gets {"event": "synonyms_pending",
+    "retry_after": seconds} instead of the synonyms.
+    '''
+    jobTitle = form.jobTitle
+    validate_title(jobTitle)
+    title = normalize_title(jobTitle)
+    client_id = client_identity(request)
+
+    async def events():
+        yield json.dumps({"event": "queries", "data": build_boolean_queries(title, platform=form.platform)}) + "\n"
+        try:
+            alternate_job_titles = await get_synonyms(jobTitle, client_id)
+        except SynonymsPending as e:
+            yield json.dumps({"event": "synonyms_pending", "retry_after": retry_after_header(e)}) + "\n"
+            yield json.dumps({"event": "done"}) + "\n"
+            return
+        except Exception as e:
+            logger.exception("synonym lookup failed for %r", jobTitle)
+            yield json.dumps({"event": "error", "message": str(e)}) + "\n"
+            return
+        yield json.dumps({"event": "additional_job_titles", "data": alternate_job_titles}) + "\n"
+        if expand and alternate_job_titles:
+            expanded = build_boolean_queries(title, alternate_job_titles, form.platform)
+            yield json.dumps({"event": "expanded_queries", "data": expanded}) + "\n"
+        yield json.dumps({"event": "done"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/data/batch")
+async def generate_smart_queries_batch(form: BatchForm, request: Request, response: Response):
+    keys = []
+    for jobTitle in form.jobTitles:
+        try:
+            keys.append(check_title(jobTitle))
+        except InvalidTitleError as e:
+            metrics.inc("titles_rejected", labels={"reason": e.reason})
+            keys.append(e)
+    unique_keys = list(dict.fromkeys(key for key in keys if isinstance(key, str)))
+    prompts = {}
+    for jobTitle, key in zip(form.jobTitles, keys):
+        if isinstance(key, str):
+            prompts.setdefault(key, normalize_title(jobTitle))
+    synonyms_by_title, errors, shed = await get_synonyms_batch(unique_keys, client_identity(request), prompts)
+
+    # one entry per input title, in request order
+    results = []
+    for jobTitle, key in zip(form.jobTitles, keys):
+        if isinstance(key, InvalidTitleError):
+            results.append({"jobTitle": jobTitle, "error": str(key)})
+        elif key in errors:
+            results.append({"jobTitle": jobTitle, "error": errors[key]})
+        elif key in shed:
+            results.append({
+                "jobTitle": jobTitle,
+                "data": build_boolean_queries(normalize_title(jobTitle), platform=form.platform),
+                "additional_job_titles": [],
+                "synonyms_pending": True,
+            })
+            response.headers["Retry-After"] = str(max(1, math.ceil(shed[key])))
+        else:
+            results.append({
+                "jobTitle": jobTitle,
+                "data": build_boolean_queries(normalize_title(jobTitle), synonyms_by_title[key], form.platform),
+                "additional_job_titles": synonyms_by_title[key],
+            })
+
     return {
         "message": "Form received successfully!",
-        "data": queries,
-        "additional_job_titles": alternate_job_titles
+        "results": results
+    }
+
+@app.get("/suggest")
+async def suggest_titles(
+    # longer queries cannot be a title, and would block the loop in the fuzzy walk
+    q: str = Query("", max_length=MAX_TITLE_LENGTH),
+    limit: int = Query(SUGGEST_MAX_RESULTS, ge=1, le=SUGGEST_MAX_RESULTS),
+):
+    '''
+    Typeahead for the job title field: known titles starting with q, or
+    spelled like it. Titles marked "cached" are answered without an LLM call.
+    '''
+    with stage("suggest"):
+        suggestions = title_index.suggest(q, limit)
+    metrics.inc("suggest_requests", labels={"matched": "yes" if suggestions else "no"})
+    return {
+        "query": q,
+        "suggestions": [{"title": title, "cached": cached} for title, cached in suggestions],
     }
+
+@app.get("/livez")
+async def liveness():
+    # the process is up and its event loop is responsive
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readiness(response: Response):
+    '''
+    Ready once startup has finished and the synonym provider is loaded; 503
+    with the failing checks otherwise. Redis is PINGed too, but an unreachable
+    Redis only makes the worker "degraded": it keeps serving without the cache.
+    '''
+    checks = {"startup": "ok" if started else "pending"}
+    if provider_loading is not None and provider_loading.done() and not provider_loading.cancelled() \
+            and provider_loading.exception() is not None:
+        checks["provider"] = "failed"
+    else:
+        checks["provider"] = "ok" if synonym_provider.ready else "loading"
+    checks["redis"] = "ok" if await redis_health.check() else "unreachable"
+    ready = all(status == "ok" for name, status in checks.items() if name != "redis")
+    if not ready:
+        response.status_code = 503
+        status = "not_ready"
+    else:
+        status = "ready" if checks["redis"] == "ok" else "degraded"
+    return {"status": status, "checks": checks}
+
+@app.get("/metrics")
+async def get_metrics():
+    record_pool_metrics(redis_client)
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def get_stats():
+    record_pool_metrics(redis_client)
+    stats = metrics.snapshot()
+    for tier in ("l1", "snapshot", "l2"):
+        hits = stats.get(f"cache_{tier}_hits", 0)
+        lookups = hits + stats.get(f"cache_{tier}_misses", 0)
+        stats[f"cache_{tier}_hit_ratio"] = hits / lookups if lookups else 0.0
+    stats["cache_l1_size"] = len(l1_cache)
+    # titles turned away by validation, and lookups answered by the negative cache
+    rejected = sum(value for name, value in stats.items() if name.startswith("titles_rejected{"))
+    lookups = stats.get("cache_l1_hits", 0) + stats.get("cache_l1_misses", 0)
+    stats["title_rejection_rate"] = rejected / (rejected + lookups) if rejected + lookups else 0.0
+    stats["negative_cache_hit_ratio"] = stats.get("negative_cache_hits", 0) / lookups if lookups else 0.0
+    checks = stats.get("negative_bloom_checks", 0)
+    stats["negative_bloom_false_positive_rate"] = \
+        stats.get("negative_bloom_false_positives", 0) / checks if checks else 0.0
+    stats["negative_bloom_fp_estimate"] = negative_cache.false_positive_rate()
+    # misses that needed the LLM: admitted vs. answered without synonyms
+    shed = sum(value for name, value in stats.items() if name.startswith("requests_shed{"))
+    needed_llm = shed + stats.get("llm_admitted", 0)
+    stats["shed_ratio"] = shed / needed_llm if needed_llm else 0.0
+    stats["llm_queue_depth"] = llm_queue.depth
+    # average tokens per LLM call, across single and batch prompts
+    for side in ("prompt", "completion"):
+        tokens = sum(value for name, value in stats.items() if name.startswith(f"llm_{side}_tokens{{"))
+        calls = sum(value for name, value in stats.items()
+                    if name.startswith(f"llm_{side}_tokens_per_call_count"))
+        stats[f"llm_{side}_tokens_per_call"] = tokens / calls if calls else 0.0
+    if synonym_snapshot is not None:
+        stats["snapshot_size"] = len(synonym_snapshot)
+    return stats
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
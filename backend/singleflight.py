@@ -0,0 +1,85 @@
+'''
+Request coalescing for cache misses.
+
+SingleFlight makes sure only one coroutine per key does the expensive work in
+this process; the lease helpers do the same across workers with a short Redis
+lock.
+'''
+import asyncio
+import uuid
+
+import metrics
+
+# Deletes the lock only if we still own it, so an expired lease that another
+# worker has since taken over is left alone.
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    '''
+    Runs at most one call per key at a time. Callers arriving while a call is
+    in flight await the same result instead of starting their own.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+
+    async def do(self, key, fn):
+        '''
+        :param key: coalescing key
+        :param fn: zero-argument coroutine function doing the work
+        :return: result of fn, shared by every concurrent caller of key
+        '''
+        # shield: a cancelled caller must not cancel the work others wait on
+        return await asyncio.shield(self.start(key, fn))
+
+    def start(self, key, fn):
+        '''
+        Starts fn for key unless it is already running, without waiting for it
+        :param key: coalescing key
+        :param fn: zero-argument coroutine function doing the work
+        :return: task running fn for key
+        '''
+        task = self._inflight.get(key)
+        if task is not None:
+            metrics.inc(f"{self.name}_coalesced")
+            return task
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def is_in_flight(self, key):
+        return key in self._inflight
+
+    def in_flight(self):
+        return len(self._inflight)
+
+
+async def acquire_lease(client, key, ttl_ms):
+    '''
+    Tries to take a short-lived Redis lock
+    :param client: redis.asyncio client
+    :param key: lock key
+    :param ttl_ms: lease duration, after which the lock frees itself
+    :return: token to pass to release_lease, or None if another worker holds it
+    '''
+    token = uuid.uuid4().hex
+    acquired = await client.set(key, token, nx=True, px=ttl_ms)
+    return token if acquired else None
+
+
+async def release_lease(client, key, token):
+    '''
+    Releases a lock taken with acquire_lease
+    :param client: redis.asyncio client
+    :param key: lock key
+    :param token: token returned by acquire_lease
+    '''
+    await client.eval(_RELEASE_SCRIPT, 1, key, token)
@@ -0,0 +1,344 @@
+'''
+Read-only, memory-mapped snapshot of the synonym table, shared by every
+worker on a host.
+
+A snapshot is one file: the canonical titles sorted, the synonyms, and
+offset arrays into both, so a lookup is a binary search over the mapped
+file. Nothing is loaded into the Python heap: the pages live in the OS page
+cache once for all worker processes, so memory per worker stays flat however
+many titles the table has.
+
+    header     magic, version, count, built_at
+    key index  count + 1 offsets (uint64) of the keys
+    value index count + 1 offsets (uint64) of the values
+    expiries   soft and hard expiry (float64) per key
+    keys       UTF-8 titles, sorted by their bytes
+    values     UTF-8 synonyms, "\\n"-separated
+
+Snapshots are built from the Redis synonym cache (or the static maps) and
+replaced atomically (write, fsync, rename). SharedSnapshot maps the current
+file and re-maps it when a newer one appears; one worker per host rebuilds it.
+
+    python snapshot.py --out synonyms.snap             # from Redis
+    python snapshot.py --out synonyms.snap --static    # from the static maps
+'''
+import argparse
+import asyncio
+import json
+import logging
+import math
+import mmap
+import os
+import socket
+import struct
+import sys
+import time
+
+from redis.exceptions import RedisError
+
+import metrics
+from canonical import canonical_key
+from singleflight import acquire_lease
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SYNSNAP\0"
+VERSION = 1
+_HEADER = struct.Struct("<8sIId")
+_OFFSETS = struct.Struct("<QQ")
+_EXPIRIES = struct.Struct("<dd")
+_OFFSET_SIZE = 8
+
+
+def write_snapshot(path, entries, built_at=None):
+    '''
+    Writes a snapshot and atomically replaces path with it
+    :param path: snapshot file
+    :param entries: iterable of (canonical title, synonyms, soft_expiry,
+        hard_expiry); for a repeated title the first entry wins
+    :param built_at: unix time recorded in the header, defaults to now
+    :return: number of titles written
+    '''
+    table = {}
+    for title, synonyms, soft_expiry, hard_expiry in entries:
+        key = title.encode("utf-8")
+        if key not in table:
+            value = "\n".join(s.replace("\n", " ") for s in synonyms).encode("utf-8")
+            table[key] = (value, soft_expiry, hard_expiry)
+    keys = sorted(table)
+    count = len(keys)
+
+    key_index = _HEADER.size
+    value_index = key_index + (count + 1) * _OFFSET_SIZE
+    expiries = value_index + (count + 1) * _OFFSET_SIZE
+    position = expiries + count * _EXPIRIES.size
+    key_offsets = []
+    for key in keys:
+        key_offsets.append(position)
+        position += len(key)
+    key_offsets.append(position)
+    value_offsets = []
+    for key in keys:
+        value_offsets.append(position)
+        position += len(table[key][0])
+    value_offsets.append(position)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, count, time.time() if built_at is None else built_at))
+            f.write(struct.pack(f"<{count + 1}Q", *key_offsets))
+            f.write(struct.pack(f"<{count + 1}Q", *value_offsets))
+            f.write(b"".join(_EXPIRIES.pack(table[key][1], table[key][2]) for key in keys))
+            f.write(b"".join(keys))
+            f.write(b"".join(table[key][0] for key in keys))
+            f.flush()
+            os.fsync(f.fileno())
+        # readers either map the old file or the new one, never a partial one
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return count
+
+
+class SynonymSnapshot:
+    '''
+    A snapshot file, memory-mapped read-only
+    :param path: snapshot file
+    :raises ValueError: the file is not a snapshot, or is truncated
+    '''
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else None
+        self.path = path
+        # which file this is: a rebuilt snapshot is a new inode
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._map is None or stat.st_size < _HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a synonym snapshot")
+        magic, version, self.count, self.built_at = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} synonym snapshot")
+        self._key_index = _HEADER.size
+        self._value_index = self._key_index + (self.count + 1) * _OFFSET_SIZE
+        self._expiries = self._value_index + (self.count + 1) * _OFFSET_SIZE
+        end, = struct.unpack_from("<Q", self._map, self._value_index + self.count * _OFFSET_SIZE)
+        if end != stat.st_size:
+            self.close()
+            raise ValueError(f"{path} is truncated")
+        self.size = stat.st_size
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, key):
+        # binary search; only the probed keys are copied out of the mapping
+        data, index, unpack = self._map, self._key_index, _OFFSETS.unpack_from
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = unpack(data, index + mid * _OFFSET_SIZE)
+            if data[start:end] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count:
+            return None
+        start, end = unpack(data, index + lo * _OFFSET_SIZE)
+        return lo if data[start:end] == key else None
+
+    def get(self, title, now=None):
+        '''
+        :param title: canonical job title
+        :param now: current unix time, defaults to time.time()
+        :return: (synonyms, soft_expiry), or None if the title is not in the
+            snapshot or its entry has expired
+        '''
+        i = self._find(title.encode("utf-8"))
+        if i is None:
+            return None
+        soft_expiry, hard_expiry = _EXPIRIES.unpack_from(self._map, self._expiries + i * _EXPIRIES.size)
+        if hard_expiry <= (time.time() if now is None else now):
+            return None
+        start, end = _OFFSETS.unpack_from(self._map, self._value_index + i * _OFFSET_SIZE)
+        value = self._map[start:end].decode("utf-8")
+        return (value.split("\n") if value else []), soft_expiry
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class SharedSnapshot:
+    '''
+    The current snapshot at path, swapped for a newer one as it is rebuilt.
+    Titles rewritten since the snapshot was built are reported as missing,
+    so callers read them from Redis instead of serving the old entry.
+
+    :param path: snapshot file, shared by the workers on this host
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.current = None
+        self._rewritten = {}
+
+    def __len__(self):
+        return len(self.current) if self.current is not None else 0
+
+    def get(self, title):
+        '''
+        :param title: canonical job title
+        :return: (synonyms, soft_expiry), or None
+        '''
+        if self.current is None or title in self._rewritten:
+            return None
+        return self.current.get(title)
+
+    def invalidate(self, title):
+        '''
+        Called when title is rewritten in Redis, by this worker or another one
+        '''
+        self._rewritten[title] = time.time()
+
+    def reload(self):
+        '''
+        Maps the snapshot file if it changed since it was last mapped
+        :return: True if a new snapshot was mapped
+        '''
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if self.current is not None and self.current.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return False
+        try:
+            snapshot = SynonymSnapshot(self.path)
+        except (OSError, ValueError):
+            logger.warning("could not map synonym snapshot %s", self.path, exc_info=True)
+            return False
+        # lookups never await, so no request is reading the old mapping
+        old, self.current = self.current, snapshot
+        if old is not None:
+            old.close()
+        # rewrites the new snapshot already includes no longer need Redis
+        self._rewritten = {title: at for title, at in self._rewritten.items() if at >= snapshot.built_at}
+        metrics.set_gauge("snapshot_entries", snapshot.count)
+        metrics.set_gauge("snapshot_bytes", snapshot.size)
+        metrics.set_gauge("snapshot_built_at", snapshot.built_at)
+        logger.info("mapped synonym snapshot %s: %d titles", self.path, snapshot.count)
+        return True
+
+    async def run(self, client, build_seconds, poll_seconds=5.0):
+        '''
+        Rebuilds the snapshot from Redis every build_seconds, on one worker
+        per host, and re-maps it on every worker as soon as it is replaced.
+        Runs until cancelled.
+        :param client: redis.asyncio client
+        :param build_seconds: seconds between rebuilds
+        :param poll_seconds: seconds between checks for a new file
+        '''
+        # held for a whole period and never released: one build per period
+        lease_key = f"lease:snapshot:{socket.gethostname()}:{os.path.abspath(self.path)}"
+        next_build = 0.0
+        while True:
+            if time.monotonic() >= next_build:
+                next_build = time.monotonic() + build_seconds
+                try:
+                    if await acquire_lease(client, lease_key, int(build_seconds * 1000)):
+                        await self.rebuild(client)
+                except (RedisError, OSError):
+                    metrics.inc("snapshot_build_errors")
+                    logger.warning("could not rebuild synonym snapshot %s", self.path, exc_info=True)
+            self.reload()
+            await asyncio.sleep(poll_seconds)
+
+    async def rebuild(self, client):
+        started = time.perf_counter()
+        built_at = time.time()
+        entries = await redis_entries(client)
+        count = await asyncio.to_thread(write_snapshot, self.path, entries, built_at)
+        metrics.inc("snapshot_builds")
+        metrics.observe("snapshot_build_seconds", time.perf_counter() - started)
+        logger.info("built synonym snapshot %s: %d titles", self.path, count)
+        self.reload()
+
+
+async def redis_entries(client, batch_size=1000):
+    '''
+    Reads every synonym cache entry from Redis. Other keys (leases, semantic
+    index hashes, ...) contain a ":" and are skipped, as are entries written
+    before they had an expiry envelope.
+    :param client: redis.asyncio client
+    :param batch_size: keys per SCAN page and MGET
+    :return: list of (title, synonyms, soft_expiry, hard_expiry)
+    '''
+    entries = []
+    keys = []
+    # Cluster clients split the keys by slot
+    mget = getattr(client, "mget_nonatomic", client.mget)
+
+    async def flush():
+        for key, raw in zip(keys, await mget(keys)):
+            try:
+                value = json.loads(raw) if raw else None
+                if isinstance(value, dict):
+                    entries.append((key, value["synonyms"], value["soft_expiry"], value["hard_expiry"]))
+            except (ValueError, KeyError, TypeError):
+                continue
+        keys.clear()
+
+    async for key in client.scan_iter(count=batch_size):
+        if ":" in key or key != canonical_key(key):
+            continue
+        keys.append(key)
+        if len(keys) >= batch_size:
+            await flush()
+    if keys:
+        await flush()
+    return entries
+
+
+def static_entries():
+    '''
+    :return: the static maps' titles and synonyms as snapshot entries that
+        never expire
+    '''
+    from roles import STATIC_SYNONYMS
+
+    return [(title, list(synonyms), math.inf, math.inf) for title, synonyms in STATIC_SYNONYMS.items()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a synonym snapshot file.")
+    parser.add_argument("--out", required=True, help="snapshot file to write")
+    parser.add_argument("--static", action="store_true", help="from the static maps instead of Redis")
+    args = parser.parse_args(argv)
+
+    if args.static:
+        entries = static_entries()
+    else:
+        import server
+
+        async def read():
+            try:
+                return await redis_entries(server.redis_client)
+            finally:
+                await server.redis_client.aclose()
+
+        try:
+            entries = asyncio.run(read())
+        except RedisError as e:
+            print(f"Redis error: {e}", file=sys.stderr)
+            return 1
+    print(json.dumps({"path": args.out, "titles": write_snapshot(args.out, entries)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
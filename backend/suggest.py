@@ -0,0 +1,278 @@
+'''
+Typeahead index of known job titles, for GET /suggest.
+
+Titles come from the static maps, every cached title and every synonym the
+LLM has generated. Steering users to a title we already know means their
+request is a cache hit instead of a fresh LLM call.
+
+The index is a character trie over normalized titles. Each title is also
+inserted from the start of every later word, so "engineer" suggests
+"software engineer". A lookup returns the best titles starting with the query
+or, if there are none, titles within a small edit distance of it (typos such
+as "sofware eng"), found by walking the trie with one edit-distance row per
+node and pruning branches that are already too far off.
+
+Prefix lookups take microseconds for tens of thousands of titles, fuzzy ones
+up to a few milliseconds (memoized per query). The index is updated in place
+as titles are cached.
+'''
+import logging
+
+from redis.exceptions import RedisError
+
+from canonical import canonical_key, normalize_title
+from freshness import decode_entry
+
+logger = logging.getLogger(__name__)
+
+# Ranking weight per source; a title keeps the highest it was added with.
+WEIGHT_SYNONYM = 1
+WEIGHT_STATIC = 2
+WEIGHT_CACHED = 3
+# A match inside a title (from a later word) ranks below one at its start.
+INNER_MATCH_PENALTY = 0.5
+
+
+def max_edits(query):
+    '''
+    :return: edits tolerated for a query of this length; short queries are
+        matched exactly, or every title would match
+    '''
+    if len(query) < 4:
+        return 0
+    if len(query) < 8:
+        return 1
+    return 2
+
+
+class _Node:
+    __slots__ = ("children", "best")
+
+    def __init__(self):
+        self.children = {}
+        # the TOP_K best titles at or below this node: [(score, title)], best first
+        self.best = []
+
+
+class TitleIndex:
+    '''
+    In-memory prefix/fuzzy index of job titles.
+
+    Every trie node keeps the top_k best-scoring titles below it, updated on
+    insert, so a prefix lookup costs one walk down the query's characters no
+    matter how many titles share the prefix.
+
+    Fuzzy lookups walk far more of the trie, so their results are memoized
+    until the index next changes.
+
+    :param top_k: suggestions kept per node; the most a lookup can return
+    :param fuzzy_cache_size: fuzzy results memoized
+    '''
+
+    def __init__(self, top_k=10, fuzzy_cache_size=4096):
+        self.top_k = top_k
+        self.fuzzy_cache_size = fuzzy_cache_size
+        self._root = _Node()
+        # title -> (weight, cached)
+        self._titles = {}
+        # query -> ranked [(title, cached)], emptied whenever the index changes
+        self._fuzzy_cache = {}
+
+    def __len__(self):
+        return len(self._titles)
+
+    def __contains__(self, title):
+        return normalize_title(title) in self._titles
+
+    def add(self, title, weight=WEIGHT_SYNONYM, cached=False):
+        '''
+        Adds a title, or raises the weight of one already in the index
+        :param title: job title, in any case
+        :param weight: ranking weight, see WEIGHT_*
+        :param cached: True if the title's synonyms are in the cache
+        '''
+        title = normalize_title(title)
+        if not title:
+            return
+        known = self._titles.get(title)
+        if known is not None:
+            if weight <= known[0] and (known[1] or not cached):
+                return
+            self._titles[title] = (max(known[0], weight), known[1] or cached)
+            self._fuzzy_cache.clear()
+            if weight <= known[0]:
+                return
+        else:
+            self._titles[title] = (weight, cached)
+            self._fuzzy_cache.clear()
+        words = title.split(" ")
+        for i in range(len(words)):
+            self._insert(" ".join(words[i:]), title, weight if i == 0 else weight * INNER_MATCH_PENALTY)
+
+    def add_cached(self, key, synonyms=()):
+        '''
+        Records a cache entry: its key and the synonyms stored under it
+        :param key: canonical job title the entry is cached under
+        :param synonyms: the entry's synonyms
+        '''
+        self.add(key, WEIGHT_CACHED, cached=True)
+        for synonym in synonyms:
+            self.add(synonym, WEIGHT_SYNONYM)
+
+    def _insert(self, text, title, score):
+        node = self._root
+        self._offer(node, title, score)
+        for char in text:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+            self._offer(node, title, score)
+
+    def _offer(self, node, title, score):
+        best = node.best
+        if len(best) >= self.top_k and score <= best[-1][0]:
+            return
+        for i, (old_score, old_title) in enumerate(best):
+            if old_title == title:
+                if score <= old_score:
+                    return
+                del best[i]
+                break
+        best.append((score, title))
+        # ties go to the shorter title
+        best.sort(key=lambda entry: (-entry[0], len(entry[1]), entry[1]))
+        del best[self.top_k:]
+
+    def suggest(self, query, limit=10):
+        '''
+        :param query: what the user has typed so far
+        :param limit: max suggestions (at most top_k)
+        :return: list of (title, cached), best first
+        '''
+        query = normalize_title(query)
+        if not query or limit <= 0:
+            return []
+        node = self._root
+        for char in query:
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            return [(title, self._titles[title][1]) for _, title in node.best[:limit]]
+        # nothing starts with the query: look for near spellings of it
+        ranked = self._fuzzy_cache.get(query)
+        if ranked is None:
+            ranked = self._fuzzy_ranked(query)
+            if len(self._fuzzy_cache) >= self.fuzzy_cache_size:
+                self._fuzzy_cache.clear()
+            self._fuzzy_cache[query] = ranked
+        return ranked[:limit]
+
+    def _fuzzy_ranked(self, query):
+        '''
+        :return: top_k titles closest to query, trying one edit before two
+            since each extra edit visits many more nodes
+        '''
+        scores = {}
+        for edits in range(1, max_edits(query) + 1):
+            self._fuzzy(query, edits, scores)
+            if scores:
+                break
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], len(item[0]), item[0]))
+        return [(title, self._titles[title][1]) for title, _ in ranked[:self.top_k]]
+
+    def _fuzzy(self, query, edits, scores):
+        '''
+        Scores the titles below every node whose path is within `edits` edits
+        of query, lowering each score by the distance
+        '''
+        # one edit-distance row per node, computed only within `edits` of the
+        # diagonal; cells outside that band can never get back under edits
+        size = len(query) + 1
+        too_far = edits + 1
+        first_row = [min(i, too_far) for i in range(size)]
+        stack = [(child, char, 1, first_row, None, "") for char, child in self._root.children.items()]
+        while stack:
+            node, char, depth, previous, before_previous, previous_char = stack.pop()
+            low = max(1, depth - edits)
+            high = min(size - 1, depth + edits)
+            row = [too_far] * size
+            if depth <= edits:
+                row[0] = depth
+            best_in_row = row[0]
+            for i in range(low, high + 1):
+                cost = previous[i - 1] + (query[i - 1] != char)
+                if row[i - 1] + 1 < cost:
+                    cost = row[i - 1] + 1
+                if previous[i] + 1 < cost:
+                    cost = previous[i] + 1
+                # swapped neighbours ("pyhton") count as one edit
+                if i > 1 and char == query[i - 2] and previous_char == query[i - 1] \
+                        and before_previous[i - 2] + 1 < cost:
+                    cost = before_previous[i - 2] + 1
+                if cost > too_far:
+                    cost = too_far
+                row[i] = cost
+                if cost < best_in_row:
+                    best_in_row = cost
+            distance = row[-1]
+            if distance <= edits:
+                # the path to this node is a close enough spelling of query
+                for score, title in node.best:
+                    score /= 1 + distance
+                    if score > scores.get(title, 0):
+                        scores[title] = score
+            if best_in_row <= edits:
+                stack.extend((child, next_char, depth + 1, row, previous, char)
+                             for next_char, child in node.children.items())
+
+
+def load_static(index, *tables):
+    '''
+    Adds the titles and synonyms of static title -> synonyms maps
+    '''
+    for table in tables:
+        for title, synonyms in table.items():
+            index.add(title, WEIGHT_STATIC)
+            for synonym in synonyms:
+                index.add(synonym, WEIGHT_STATIC)
+
+
+async def load_cached(index, client, batch_size=500):
+    '''
+    Adds every synonym cache entry in Redis, with its synonyms. Other keys
+    (leases, semantic index hashes, ...) contain a ":" and are skipped.
+    :param index: TitleIndex to fill
+    :param client: redis.asyncio client
+    :param batch_size: keys per SCAN page and MGET
+    :return: number of entries added
+    '''
+    added = 0
+    keys = []
+
+    async def flush():
+        nonlocal added
+        for key, raw in zip(keys, await client.mget(keys)):
+            if not raw:
+                continue
+            try:
+                synonyms, _ = decode_entry(raw)
+            except (ValueError, KeyError, TypeError):
+                continue
+            index.add_cached(key, synonyms)
+            added += 1
+        keys.clear()
+
+    try:
+        async for key in client.scan_iter(count=batch_size):
+            if ":" in key or key != canonical_key(key):
+                continue
+            keys.append(key)
+            if len(keys) >= batch_size:
+                await flush()
+        if keys:
+            await flush()
+    except RedisError:
+        logger.warning("could not load cached titles into the suggest index", exc_info=True)
+    return added
@@ -0,0 +1,83 @@
+'''
+Per-request stage timing.
+
+Code on the request path wraps its steps in `with stage("redis_get"):`. Each
+duration feeds the querygen_stage_seconds histogram and, through
+TimingMiddleware, the response's Server-Timing header, e.g.
+
+    Server-Timing: normalize;dur=0.004, cache_l1;dur=0.002, redis_get;dur=0.41
+'''
+import contextvars
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# stage name -> milliseconds, for the request being handled
+_stages = contextvars.ContextVar("stages", default=None)
+
+
+@contextmanager
+def stage(name):
+    '''
+    Times the enclosed block as one stage of the current request
+    :param name: stage name, as it will appear in Server-Timing
+    '''
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe("stage_seconds", elapsed, {"stage": name})
+        stages = _stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed * 1000
+
+
+def server_timing(stages):
+    '''
+    :param stages: dict stage name -> milliseconds
+    :return: Server-Timing header value
+    '''
+    return ", ".join(f"{name};dur={ms:.3f}" for name, ms in stages.items())
+
+
+class TimingMiddleware:
+    '''
+    ASGI middleware that records request latency per route and adds a
+    Server-Timing header with the stages timed while handling the request.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages = {}
+        token = _stages.set(stages)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                stages["total"] = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(stages).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _stages.reset(token)
+            route = scope.get("route")
+            metrics.observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - started,
+                {"route": getattr(route, "path", "unmatched"), "method": scope["method"], "status": status},
+            )
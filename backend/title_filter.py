@@ -0,0 +1,106 @@
+'''
+Cheap checks that a string posted as a job title could be one, run before
+any cache lookup or LLM call.
+
+Empty input, too many words, keyboard mashing, control characters and
+prompt-injection attempts are rejected with a reason, so they neither cost
+an LLM call nor end up in the cache. Punctuation is not: canonical_key drops
+it anyway. (Over-long strings are already rejected by the request models.)
+'''
+import re
+import unicodedata
+
+from canonical import canonical_key
+
+MAX_TITLE_WORDS = 12
+# a word this long is not a word
+MAX_WORD_CHARS = 30
+
+_INJECTION = re.compile(
+    r"\b(ignore|disregard|forget|override)\b.{0,40}\b(instructions?|prompts?|rules|above|previous)\b"
+    r"|\b(system|developer)\s+(prompt|message)\b"
+    r"|\byou\s+are\s+(now|an?)\b"
+    r"|\bact\s+as\b"
+    r"|\b(respond|reply|answer|output)\s+(with|in|only)\b"
+    r"|https?://|www\.",
+    re.IGNORECASE,
+)
+_REPEATED = re.compile(r"(\S)\1{3,}")
+# seven consonants in a row (y counts as a vowel) does not happen in English titles
+_CONSONANT_RUN = re.compile(r"[bcdfghjklmnpqrstvwxz]{7,}", re.IGNORECASE)
+_LATIN_WORD = re.compile(r"[a-z]{6,}", re.IGNORECASE)
+_VOWEL = re.compile(r"[aeiouy]", re.IGNORECASE)
+
+
+class InvalidTitleError(ValueError):
+    '''
+    :param reason: short machine-readable reason, used as a metric label
+    :param message: explanation for the client
+    '''
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def check_title(title):
+    '''
+    :param title: job title as the user typed it
+    :return: its canonical key
+    :raises InvalidTitleError: the title cannot be a job title
+    '''
+    key = canonical_key(title)
+    if not key:
+        raise InvalidTitleError("empty", "empty job title")
+    if _INJECTION.search(title):
+        raise InvalidTitleError("injection", "that does not look like a job title")
+    if any(unicodedata.category(c)[0] == "C" and not c.isspace() for c in title):
+        # control, format and unassigned code points, e.g. zero-width or bidi overrides
+        raise InvalidTitleError("characters", "job titles cannot contain those characters")
+    words = title.split()
+    if len(words) > MAX_TITLE_WORDS:
+        raise InvalidTitleError("too_many_words", f"job titles are at most {MAX_TITLE_WORDS} words")
+    if looks_like_gibberish(title, words):
+        raise InvalidTitleError("gibberish", "that does not look like a job title")
+    return key
+
+
+def looks_like_gibberish(title, words):
+    letters = sum(c.isalpha() for c in title)
+    if letters < 2 or letters < 0.5 * sum(not c.isspace() for c in title):
+        return True
+    if any(len(word) > MAX_WORD_CHARS for word in words):
+        return True
+    if _REPEATED.search(title) or _CONSONANT_RUN.search(title):
+        return True
+    # vowel-less Latin words (acronyms are shorter)
+    return any(not _VOWEL.search(word) for word in _LATIN_WORD.findall(title))
+
+
+def usable_synonyms(title, synonyms, limit=None, max_length=None):
+    '''
+    :param title: job title the synonyms are for
+    :param synonyms: what the LLM returned
+    :param limit: most synonyms to keep
+    :param max_length: longest synonym to keep
+    :return: the synonyms that are job titles, stripped, without the title
+        itself or repeats
+    '''
+    usable = []
+    seen = {canonical_key(title)}
+    for synonym in synonyms:
+        if limit is not None and len(usable) >= limit:
+            break
+        if not isinstance(synonym, str):
+            continue
+        synonym = synonym.strip()
+        if max_length is not None and len(synonym) > max_length:
+            continue
+        try:
+            key = check_title(synonym)
+        except InvalidTitleError:
+            continue
+        if key not in seen:
+            seen.add(key)
+            usable.append(synonym)
+    return usable
@@ -0,0 +1,252 @@
+'''
+Pre-warms the Redis synonym cache before a deploy or launch.
+
+Titles are streamed from ROLE_SYNONYMS / SYNONYM_MAP and from any number of
+title files (.txt one per line, .csv, .jsonl). Titles already cached are
+skipped with pipelined EXISTS; the rest are generated with multi-title LLM
+prompts, a bounded number at a time, and written back with pipelined SETEX.
+
+Progress is checkpointed after every chunk, so an interrupted run picks up
+where it left off with --resume.
+
+    python warm_cache.py --file top_titles.csv --concurrency 4 --resume
+'''
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+from redis.exceptions import RedisError
+
+import server
+from canonical import canonical_key
+from freshness import encode_entry
+from negative_cache import PREFIX as NEGATIVE_PREFIX
+from roles import ROLE_SYNONYMS, STATIC_SYNONYMS, SYNONYM_MAP
+
+
+# -----title sources------
+def static_titles():
+    '''
+    yields every title and synonym in the static role maps
+    '''
+    for table in (ROLE_SYNONYMS, SYNONYM_MAP):
+        for title, synonyms in table.items():
+            yield title
+            yield from synonyms
+
+
+def file_titles(path, column="title"):
+    '''
+    yields titles from a file, one at a time
+    :param path: .txt (one title per line), .csv (column `column`) or .jsonl
+        (objects with a `column` field, or bare strings)
+    :param column: CSV column / JSON field holding the title
+    '''
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8") as f:
+        if ext == ".csv":
+            for row in csv.DictReader(f):
+                yield row.get(column) or ""
+        elif ext in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record if isinstance(record, str) else record.get(column) or ""
+        else:
+            for line in f:
+                yield line
+
+
+def unique_titles(sources):
+    '''
+    turns titles into cache keys the way the server does and drops duplicates
+    :param sources: iterables of raw titles
+    '''
+    seen = set()
+    for source in sources:
+        for title in source:
+            key = canonical_key(title)
+            if key and key not in seen:
+                seen.add(key)
+                yield key
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -----checkpoints------
+def load_checkpoint(path):
+    '''
+    :param path: checkpoint file
+    :return: number of titles already handled by a previous run
+    '''
+    try:
+        with open(path) as f:
+            return json.load(f)["done"]
+    except FileNotFoundError:
+        return 0
+
+
+def save_checkpoint(path, done):
+    # write-then-rename so a crash never leaves a half-written checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"done": done, "updated_at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+# -----warming------
+async def missing_titles(client, titles):
+    '''
+    :param client: redis.asyncio client
+    :param titles: canonical titles
+    :return: the titles that have neither a cache entry nor a negative one yet
+    '''
+    async with client.pipeline(transaction=False) as pipe:
+        for title in titles:
+            pipe.exists(title, NEGATIVE_PREFIX + title)
+        exists = await pipe.execute()
+    return [title for title, found in zip(titles, exists) if not found]
+
+
+async def generate(titles, semaphore, static):
+    '''
+    :param titles: titles to generate synonyms for
+    :param semaphore: bounds the number of LLM prompts in flight
+    :param static: use the static maps' synonyms where available instead of the LLM
+    :return: (dict title -> synonyms, list of titles that failed)
+    '''
+    results = {}
+    if static:
+        for title in titles:
+            synonyms = STATIC_SYNONYMS.get(title)
+            if synonyms:
+                results[title] = list(synonyms)
+    pending = [title for title in titles if title not in results]
+
+    async def one_prompt(batch):
+        async with semaphore:
+            try:
+                found = await server.llm_call_batch(batch)
+            except Exception:
+                found = {}
+            for title in batch:
+                if title not in found:
+                    try:
+                        found[title] = await server.llm_call(title)
+                    except Exception:
+                        pass
+            return found
+
+    size = server.LLM_BATCH_SIZE
+    batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+    for found in await asyncio.gather(*(one_prompt(batch) for batch in batches)):
+        results.update(found)
+    failed = [title for title in pending if title not in results]
+    return results, failed
+
+
+async def write_back(client, results):
+    '''
+    caches the synonyms; titles the LLM had none for go to the negative
+    cache instead, as they would on the server
+    '''
+    async with client.pipeline(transaction=False) as pipe:
+        for title, synonyms in results.items():
+            if synonyms:
+                pipe.setex(title, server.CACHE_HARD_TTL,
+                           encode_entry(synonyms, server.CACHE_TTL, server.CACHE_HARD_TTL))
+            else:
+                server.negative_cache.store(pipe, title)
+        await pipe.execute()
+
+
+async def warm(titles, client, concurrency, chunk_size, checkpoint, resume, static):
+    '''
+    warms the cache for a stream of canonical titles and prints progress
+    :return: dict of totals
+    '''
+    start_at = load_checkpoint(checkpoint) if resume else 0
+    semaphore = asyncio.Semaphore(concurrency)
+    totals = {"seen": 0, "skipped": 0, "written": 0, "no_synonyms": 0, "failed": 0}
+    started = time.perf_counter()
+
+    # the title stream is deterministic for the same inputs, so resuming is
+    # just skipping what the last run got through
+    done = start_at
+    for chunk in chunked(itertools.islice(titles, start_at, None), chunk_size):
+        missing = await missing_titles(client, chunk)
+        results, failed = await generate(missing, semaphore, static)
+        if results:
+            await write_back(client, results)
+
+        done += len(chunk)
+        save_checkpoint(checkpoint, done)
+        totals["seen"] += len(chunk)
+        totals["skipped"] += len(chunk) - len(missing)
+        no_synonyms = sum(not synonyms for synonyms in results.values())
+        totals["written"] += len(results) - no_synonyms
+        totals["no_synonyms"] += no_synonyms
+        totals["failed"] += len(failed)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{done} titles | {totals['written']} written, {totals['skipped']} already cached, "
+            f"{totals['no_synonyms']} without synonyms, {totals['failed']} failed | {totals['seen'] / elapsed:.1f} titles/s",
+            file=sys.stderr,
+        )
+    totals["elapsed_seconds"] = time.perf_counter() - started
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-warm the Redis synonym cache.")
+    parser.add_argument("--file", action="append", default=[],
+                        help="title list (.txt, .csv or .jsonl); may be repeated")
+    parser.add_argument("--column", default="title", help="CSV column / JSONL field with the title")
+    parser.add_argument("--no-static", action="store_true",
+                        help="don't include titles from ROLE_SYNONYMS and SYNONYM_MAP")
+    parser.add_argument("--static-synonyms", action="store_true",
+                        help="cache the static maps' own synonyms instead of asking the LLM for those titles")
+    parser.add_argument("--concurrency", type=int, default=server.LLM_MAX_CONCURRENCY,
+                        help="LLM prompts in flight at once")
+    parser.add_argument("--chunk-size", type=int, default=500, help="titles per EXISTS/SETEX round")
+    parser.add_argument("--checkpoint", default=".warm_cache.checkpoint")
+    parser.add_argument("--resume", action="store_true", help="skip titles handled by the last run")
+    args = parser.parse_args(argv)
+
+    sources = [] if args.no_static else [static_titles()]
+    sources += [file_titles(path, args.column) for path in args.file]
+
+    async def run():
+        try:
+            await server.synonym_provider.start()
+            return await warm(unique_titles(sources), server.redis_client, args.concurrency,
+                              args.chunk_size, args.checkpoint, args.resume, args.static_synonyms)
+        finally:
+            await server.synonym_provider.close()
+            await server.redis_client.aclose()
+
+    try:
+        totals = asyncio.run(run())
+    except RedisError as e:
+        print(f"Redis error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(totals))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
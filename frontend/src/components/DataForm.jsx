@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useRef, useState } from "react";
 // import Results from "./Results";
 import "./DataForm.css";
 
@@ -7,6 +7,10 @@ function DataForm() {
   const [queryArray, setqueryArray] = useState([]);
   const [alternateTitles, setalternateTitles] = useState([]);
   const [loading, setloading] = useState(false);
+  const [titlesLoading, settitlesLoading] = useState(false);
+  const [suggestions, setsuggestions] = useState([]);
+  const [retryAfter, setretryAfter] = useState(null);
+  const suggestRequest = useRef(null);
 
   const handleChange = (e) => {
     const target = e.target;
@@ -14,23 +18,76 @@ function DataForm() {
     const name = target.name;
     setInputs((values) => ({ ...values, [name]: value }));
     console.log(inputs);
+    if (name === "jobTitle") fetchSuggestions(value);
+  };
+
+  // Known titles as the user types; picking one usually means a cache hit.
+  // A keystroke cancels the previous keystroke's request.
+  const fetchSuggestions = async (query) => {
+    if (suggestRequest.current) suggestRequest.current.abort();
+    if (!query.trim()) {
+      setsuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    suggestRequest.current = controller;
+    try {
+      const response = await fetch(
+        `http://127.0.0.1:8000/suggest?q=${encodeURIComponent(query)}`,
+        { signal: controller.signal }
+      );
+      const body = await response.json();
+      setsuggestions(body.suggestions.map((suggestion) => suggestion.title));
+    } catch (err) {
+      if (err.name !== "AbortError") setsuggestions([]);
+    }
+  };
+
+  // /data/stream sends one JSON object per line: the queries first, then
+  // the alternate titles once the LLM answers, then queries using them.
+  const handleEvent = (event) => {
+    if (event.event === "queries" || event.event === "expanded_queries") {
+      setqueryArray(event.data);
+      setloading(false);
+    } else if (event.event === "additional_job_titles") {
+      setalternateTitles(event.data);
+      settitlesLoading(false);
+    } else if (event.event === "synonyms_pending") {
+      // the server is busy; the queries above are for the title alone
+      setretryAfter(event.retry_after);
+      settitlesLoading(false);
+    } else if (event.event === "error" || event.event === "done") {
+      setloading(false);
+      settitlesLoading(false);
+    }
   };
 
   const handleSubmit = async (e) => {
     e.preventDefault();
     setloading(true);
-    const response = await fetch("http://127.0.0.1:8000/data", {
+    settitlesLoading(true);
+    setalternateTitles([]);
+    setretryAfter(null);
+    const response = await fetch("http://127.0.0.1:8000/data/stream", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(inputs),
     });
-    const result = await response.json();
 
-    // console.log(result.data);
-    // console.log(result.additional_job_titles);
-    setqueryArray(result.data);
-    setalternateTitles(result.additional_job_titles);
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split("\n");
+      buffered = lines.pop();
+      lines.filter((line) => line.trim()).forEach((line) => handleEvent(JSON.parse(line)));
+    }
+    if (buffered.trim()) handleEvent(JSON.parse(buffered));
     setloading(false);
+    settitlesLoading(false);
   };
 
   const openLinkedIn = (query) => {
@@ -61,7 +118,14 @@ function DataForm() {
             value={inputs.jobTitle || ""}
             onChange={handleChange}
             placeholder="e.g. Software Engineer"
+            list="job-title-suggestions"
+            autoComplete="off"
           />
+          <datalist id="job-title-suggestions">
+            {suggestions.map((title) => (
+              <option key={title} value={title} />
+            ))}
+          </datalist>
         </div>
 
         {/* <div className="checkbox-group">
@@ -120,6 +184,12 @@ function DataForm() {
       {!loading && queryArray.length > 0 && (
         <p className="suggestions">Explore Similar Jobs</p>
       )}
+      {!loading && titlesLoading && queryArray.length > 0 && (
+        <p>Finding similar job titles...</p>
+      )}
+      {!loading && retryAfter !== null && (
+        <p>Similar job titles are busy right now, try again in {retryAfter}s.</p>
+      )}
       <div className="alternate-titles">
         {!loading &&
           queryArray.length > 0 &&